@@ -0,0 +1,800 @@
+import collections
+import itertools
+import logging
+import os
+import queue
+import re
+import subprocess
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+PROMPT = b"DES>"
+
+# Comandos que configuran la sesión de DES y que hay que repetir cuando se
+# relanza un proceso para que quede en el mismo estado que el anterior.
+SETUP_COMMANDS = (
+    "/cd",
+    "/consult",
+    "/reconsult",
+    "/restore_state",
+    "/use_db",
+    "/open_db",
+    "/set_flag",
+)
+
+
+# Comandos que modifican la base de datos en memoria de DES; en modo
+# replicado se aplican a todas las réplicas.
+WRITE_COMMANDS = (
+    "/assert",
+    "/retract",
+    "/retractall",
+    "/abolish",
+    "/consult",
+    "/reconsult",
+    "/restore_state",
+)
+
+SQL_WRITES = ("insert", "delete", "update", "create", "drop", "alter", "rename")
+
+
+class DesError(Exception):
+    pass
+
+
+class DesTimeout(DesError):
+    pass
+
+
+class DesCrashed(DesError):
+    pass
+
+
+class DesUnavailable(DesError):
+    pass
+
+
+def transform_query(query):
+    if "/" in query:
+        return query
+    return "/tapi " + query
+
+
+_limit_clause = re.compile(r"\slimit\s+(\d+)(?:\s*,\s*(\d+)|\s+offset\s+\d+)?\s*;?\s*$", re.IGNORECASE)
+_select = re.compile(r"\s*select\s+", re.IGNORECASE)
+_select_top = re.compile(r"\s*select\s+top\s", re.IGNORECASE)
+
+
+def row_limit(query, select_limit=None):
+    # Número máximo de filas que verá el cliente: el LIMIT de la consulta o,
+    # si no lo tiene, el sql_select_limit de la sesión (solo para SELECT).
+    match = _limit_clause.search(query)
+    if match:
+        first, count = match.groups()
+        return int(count if count is not None else first)
+
+    if select_limit is not None and _select.match(query):
+        return select_limit
+    return None
+
+
+def push_select_limit(query, select_limit):
+    # Lleva sql_select_limit a DES como TOP para que no calcule la relación
+    # entera; las consultas con LIMIT o TOP propios se dejan tal cual.
+    if select_limit is None or "/" in query:
+        return query
+    if _limit_clause.search(query) or _select_top.match(query):
+        return query
+
+    match = _select.match(query)
+    if not match:
+        return query
+    return '{}TOP {} {}'.format(query[:match.end()], select_limit, query[match.end():])
+
+
+def is_setup_command(query):
+    command = query.strip().lower()
+    return any(command.startswith(prefix) for prefix in SETUP_COMMANDS)
+
+
+def _sql_body(command):
+    # Sentencia SQL de la consulta, venga con /tapi, con /sql o sin prefijo
+    # (transform_query deja sin tocar las que contienen '/'); None si es un
+    # comando de DES.
+    for prefix in ("/tapi ", "/sql "):
+        if command.startswith(prefix):
+            return command[len(prefix):].lstrip()
+    if command.startswith("/"):
+        return None
+    return command
+
+
+def is_write(query):
+    command = query.strip().lower()
+    body = _sql_body(command)
+    if body is not None:
+        return body.startswith(SQL_WRITES)
+    return command.startswith(WRITE_COMMANDS) or is_setup_command(command)
+
+
+def is_read_only(query):
+    body = _sql_body(query.strip().lower())
+    return body is not None and body.startswith(("select", "with", "show", "describe"))
+
+
+class DesWorker:
+    def __init__(self, route, setup_commands=(), startup_timeout=10, idle_gap=0.1, encoding='utf-8'):
+        self.route = route
+        self.encoding = encoding
+        self.setup_commands = list(setup_commands)
+        self.startup_timeout = startup_timeout
+        self.idle_gap = idle_gap
+
+        self.process = None
+        self.output_queue = None
+        self.healthy = False
+        self.busy = False
+        self.last_used = 0.0
+        self.restarts = 0
+        # Última escritura replicada que ha aplicado este proceso
+        self.applied = 0
+        self.rebuilding = False
+        # Ha respondido distinto que las demás réplicas a una escritura
+        self.diverged = False
+
+    def __repr__(self):
+        pid = self.process.pid if self.process else None
+        return '<DesWorker pid={} healthy={} busy={}>'.format(pid, self.healthy, self.busy)
+
+    def start(self):
+        self.process = subprocess.Popen([self.route, "-c"],
+                                        stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                        stderr=subprocess.PIPE)
+        # Cola acotada: si nadie consume la salida (p. ej. un cursor abierto
+        # que el cliente no lee) DES se bloquea en lugar de llenar la memoria.
+        self.output_queue = queue.Queue(maxsize=64)
+
+        threading.Thread(target=self._reader_thread, args=(self.process, self.output_queue),
+                         daemon=True).start()
+
+        # Limpia el mensaje inicial
+        logger.info("Limpiando mensaje inicial de DES (pid %s)...", self.process.pid)
+        self._read_initial_message()
+
+        for command in self.setup_commands:
+            logger.info("Reaplicando comando de sesión: %s", command)
+            self.execute(command, timeout=self.startup_timeout)
+
+        self.healthy = True
+        self.last_used = time.monotonic()
+
+    def stop(self):
+        self.healthy = False
+        if self.process is None:
+            return
+
+        try:
+            self.process.kill()
+            self.process.wait(timeout=5)
+        except (OSError, subprocess.TimeoutExpired):
+            logger.warning("No se pudo terminar el proceso DES %s", self.process.pid)
+
+        for pipe in (self.process.stdin, self.process.stdout, self.process.stderr):
+            try:
+                pipe.close()
+            except OSError:
+                pass
+
+    def restart(self):
+        self.stop()
+        self.restarts += 1
+        self.start()
+
+    def alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    @staticmethod
+    def _reader_thread(p, q):
+        # Se pasan a la cola trozos de bytes tal cual los da la tubería, sin
+        # decodificar.
+        while True:
+            chunk = p.stdout.read1(65536)
+            if not chunk:
+                break
+            q.put(chunk)
+        # Marca de fin de flujo: el proceso ha terminado o ha cerrado stdout.
+        q.put(None)
+
+    def _read_initial_message(self):
+        end_time = time.monotonic() + self.startup_timeout
+        buffer = b''
+        last_data = None
+
+        # El mensaje inicial termina con el prompt; se da por limpio cuando
+        # tras el prompt el proceso se queda callado.
+        while time.monotonic() < end_time:
+            try:
+                chunk = self.output_queue.get(timeout=0.1)
+            except queue.Empty:
+                if PROMPT in buffer and time.monotonic() - last_data >= 5 * self.idle_gap:
+                    return buffer
+                continue
+
+            if chunk is None:
+                raise DesCrashed('DES terminó durante el arranque')
+
+            buffer += chunk
+            last_data = time.monotonic()
+
+        raise DesTimeout('DES no mostró el prompt en {} s'.format(self.startup_timeout))
+
+    def _read_chunk(self, deadline, timeout):
+        # La respuesta solo termina con un marcador; el silencio de DES no
+        # cuenta como fin (puede estar calculando las filas siguientes), así
+        # que se espera hasta el plazo de la consulta entera.
+        while True:
+            if deadline is None:
+                wait = None
+            else:
+                wait = deadline - time.monotonic()
+                if wait <= 0:
+                    raise DesTimeout('DES no terminó de responder en {} s'.format(timeout))
+
+            try:
+                chunk = self.output_queue.get(timeout=wait)
+            except queue.Empty:
+                continue
+
+            if chunk is None:
+                raise DesCrashed('DES terminó inesperadamente')
+
+            return chunk
+
+    @staticmethod
+    def _without_marker(line, markers):
+        # El marcador que cierra la salida (el prompt) no es una fila
+        for marker in markers:
+            if line.endswith(marker):
+                return line[:-len(marker)].rstrip(b'\r ')
+        return line
+
+    @staticmethod
+    def _find_marker(data, start, end, markers):
+        # Posición donde termina el primer marcador de data[start:end], o -1
+        ret = -1
+        for marker in markers:
+            pos = data.find(marker, start, end)
+            if pos >= 0 and (ret < 0 or pos + len(marker) < ret):
+                ret = pos + len(marker)
+        return ret
+
+    def read_until_marker(self, *markers, timeout=None):
+        buffer = b''
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        while True:
+            chunk = self._read_chunk(deadline, timeout)
+
+            # Solo se busca en lo nuevo y en el solape con lo anterior
+            start = max(0, len(buffer) - max(map(len, markers)) + 1)
+            buffer += chunk
+            end = self._find_marker(buffer, start, len(buffer), markers)
+            if end >= 0:
+                return buffer[:end]
+
+    def iter_lines(self, *markers, timeout=None):
+        line = b''
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        while True:
+            chunk = self._read_chunk(deadline, timeout)
+
+            data = line + chunk
+            start = 0
+            while True:
+                nl = data.find(b'\n', start)
+                end = self._find_marker(data, start, len(data) if nl < 0 else nl, markers)
+                if end >= 0:
+                    last = self._without_marker(data[start:end], markers)
+                    if last:
+                        yield last
+                    self.last_used = time.monotonic()
+                    return
+
+                if nl < 0:
+                    line = data[start:]
+                    break
+
+                # Las líneas se entregan como bytes, sin decodificar
+                yield data[start:nl - 1 if nl > start and data[nl - 1] == 0x0d else nl]
+                start = nl + 1
+
+    def send(self, query):
+        if not self.alive():
+            raise DesCrashed('El proceso DES no está en ejecución')
+
+        # Descarta restos de la respuesta anterior (p. ej. el espacio que
+        # sigue al prompt) para que no se mezclen con la nueva.
+        while True:
+            try:
+                chunk = self.output_queue.get_nowait()
+            except queue.Empty:
+                break
+            if chunk is None:
+                raise DesCrashed('DES terminó inesperadamente')
+
+        try:
+            self.process.stdin.write((query + '\n').encode(self.encoding))
+            self.process.stdin.flush()
+        except OSError as e:
+            raise DesCrashed('No se pudo escribir en DES: {}'.format(e)) from e
+
+    def execute(self, query, timeout=None):
+        self.send(query)
+        response = self.read_until_marker(b"|:", PROMPT, timeout=timeout)
+        self.last_used = time.monotonic()
+        return response
+
+
+class DesResult:
+    def __init__(self, supervisor, worker, lines, pending=()):
+        self._supervisor = supervisor
+        self._worker = worker
+        self._lines = lines
+        self._pending = list(pending)
+        self._spool = None
+        self.closed = worker is None
+
+    @property
+    def exhausted(self):
+        # Los resultados precargados están cerrados pero aún tienen filas
+        return self.closed and not self._pending
+
+    def fetch(self, size=None):
+        rows = self._pending[:size]
+        self._pending = self._pending[len(rows):]
+
+        if self.closed or (size is not None and len(rows) >= size):
+            return rows
+
+        try:
+            for line in self._lines:
+                rows.append(line)
+                if size is not None and len(rows) >= size:
+                    return rows
+        except DesError:
+            self._abort()
+            raise
+
+        self._finish()
+        return rows
+
+    def close(self):
+        self._pending = []
+        if self.closed:
+            return
+
+        # Se descarta el resto de la salida sin guardarla para dejar el
+        # proceso listo para la siguiente consulta.
+        try:
+            for _ in self._lines:
+                pass
+        except DesError:
+            self._abort()
+            return
+
+        self._finish()
+
+    def spool(self, limit=None, max_memory=1 << 20):
+        # Vuelca el resto de la salida (como mucho limit líneas contando las
+        # ya leídas) a un fichero temporal, en memoria hasta max_memory
+        # bytes, y libera el proceso DES: un cursor abierto no debe
+        # retenerlo mientras el cliente no pide filas.
+        if self.closed or self._worker is None:
+            return
+
+        spool = tempfile.SpooledTemporaryFile(max_size=max_memory)
+        count = len(self._pending)
+        try:
+            for line in self._lines:
+                if limit is None or count < limit:
+                    spool.write(line + b'\n')
+                    count += 1
+        except DesError:
+            spool.close()
+            self._abort()
+            raise
+
+        self._supervisor._release(self._worker)
+        self._worker = None
+
+        spool.seek(0)
+        self._spool = spool
+        self._lines = (line[:-1] for line in iter(spool.readline, b''))
+
+    def _finish(self):
+        self.closed = True
+        if self._spool is not None:
+            self._spool.close()
+        if self._worker is not None:
+            self._supervisor._release(self._worker)
+            self._worker = None
+
+    def _abort(self):
+        self.closed = True
+        self._supervisor._respawn(self._worker)
+        self._worker = None
+
+
+class DesSupervisor:
+    def __init__(self, route, workers=1, query_timeout=30, probe_interval=10,
+                 probe_command='', retries=1, setup_commands=(), encoding='utf-8',
+                 replicated=False, snapshot_dir='des_snapshots', snapshot_every=100):
+        self.route = route
+        self.query_timeout = query_timeout
+        self.probe_interval = probe_interval
+        self.probe_command = probe_command
+        self.retries = retries
+        self.setup_commands = list(setup_commands)
+        self.encoding = encoding
+
+        self._cond = threading.Condition()
+        self._workers = [DesWorker(route, self.setup_commands, encoding=encoding) for _ in range(workers)]
+        self._stopped = threading.Event()
+        self._next = 0
+
+        # Modo replicado: las escrituras se numeran y se aplican en el mismo
+        # orden en todas las réplicas; las lecturas solo van a réplicas al día.
+        # Se guarda el registro de escrituras desde la última instantánea
+        # para poner al día réplicas relanzadas o divergentes; cada
+        # snapshot_every escrituras se hace una instantánea y se recorta.
+        # Con más de un proceso es obligatorio: si no, cada escritura solo
+        # llegaría al proceso que la atiende y las lecturas, que se reparten,
+        # verían estados distintos.
+        self.replicated = replicated or workers > 1
+        self.snapshot_dir = snapshot_dir
+        self.snapshot_every = snapshot_every
+        self.max_log = 4 * snapshot_every
+        self.sequence = 0
+        self._log = []
+        self._snapshot = None
+        self._write_lock = threading.Lock()
+
+    def start(self):
+        for worker in self._workers:
+            worker.start()
+
+        threading.Thread(target=self._monitor_thread, daemon=True).start()
+        logger.info("Supervisor de DES iniciado con %s proceso(s).", len(self._workers))
+
+    def stop(self):
+        self._stopped.set()
+        with self._cond:
+            self._cond.notify_all()
+
+        for worker in self._workers:
+            worker.stop()
+
+    @property
+    def workers(self):
+        return list(self._workers)
+
+    def _acquire(self, timeout):
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                if self._stopped.is_set():
+                    raise DesUnavailable('El supervisor de DES está detenido')
+
+                # Reparto rotatorio entre los procesos libres; en modo
+                # replicado solo valen los que han aplicado todas las escrituras.
+                count = len(self._workers)
+                for n in range(count):
+                    worker = self._workers[(self._next + n) % count]
+                    if not worker.healthy or worker.busy:
+                        continue
+                    if self.replicated and worker.applied != self.sequence:
+                        continue
+                    worker.busy = True
+                    self._next = (self._next + n + 1) % count
+                    return worker
+
+                # Se espera en cola a que algún proceso quede libre o termine
+                # de relanzarse.
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise DesUnavailable('No hay procesos DES disponibles')
+                self._cond.wait(remaining)
+
+    def _release(self, worker):
+        # Una réplica divergente se reconstruye en cuanto la suelta quien
+        # la estuviera usando.
+        with self._cond:
+            if not worker.diverged:
+                worker.busy = False
+                self._cond.notify_all()
+                return
+
+        self._respawn(worker)
+
+    def _respawn(self, worker):
+        # Se relanza en segundo plano; el proceso queda ocupado hasta que
+        # vuelve a estar sano para que nadie más lo use entretanto.
+        with self._cond:
+            worker.healthy = False
+            worker.busy = True
+            worker.rebuilding = True
+            worker.diverged = False
+            self._cond.notify_all()
+
+        def run():
+            delay = 0.5
+            while not self._stopped.is_set():
+                try:
+                    logger.warning("Relanzando proceso DES %r", worker)
+                    worker.setup_commands = list(self.setup_commands)
+                    worker.restart()
+                    if self.replicated:
+                        self._rebuild(worker)
+                    break
+                except (OSError, DesError) as e:
+                    logger.error("No se pudo relanzar DES: %s", e)
+                    worker.stop()
+                    time.sleep(delay)
+                    delay = min(delay * 2, 30)
+
+            with self._cond:
+                worker.rebuilding = False
+            self._release(worker)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def _monitor_thread(self):
+        while not self._stopped.wait(self.probe_interval):
+            with self._cond:
+                idle = []
+                for worker in self._workers:
+                    if worker.healthy and not worker.busy:
+                        worker.busy = True
+                        idle.append(worker)
+
+            for worker in idle:
+                if time.monotonic() - worker.last_used < self.probe_interval:
+                    self._release(worker)
+                    continue
+
+                try:
+                    worker.execute(self.probe_command, timeout=self.query_timeout)
+                except DesError as e:
+                    logger.error("Sonda de vida de DES fallida (%s): %s", worker, e)
+                    self._respawn(worker)
+                else:
+                    self._release(worker)
+
+    def execute(self, query):
+        transformed_query = transform_query(query)
+
+        if self.replicated and is_write(transformed_query):
+            return self._replicate(transformed_query)
+
+        retries = self.retries if is_read_only(transformed_query) else 0
+
+        for attempt in range(retries + 1):
+            worker = self._acquire(self.query_timeout)
+            try:
+                logger.info("Ejecutando consulta: %s", transformed_query)
+                response = worker.execute(transformed_query, timeout=self.query_timeout)
+            except DesError as e:
+                logger.error("Fallo de DES ejecutando %r: %s", transformed_query, e)
+                self._respawn(worker)
+                if attempt >= retries:
+                    raise
+                logger.info("Reintentando consulta de solo lectura: %s", transformed_query)
+                continue
+
+            self._release(worker)
+
+            if is_setup_command(transformed_query):
+                self._broadcast_setup(worker, transformed_query)
+
+            return response
+
+    def open(self, query):
+        transformed_query = transform_query(query)
+
+        if is_setup_command(transformed_query) or (self.replicated and is_write(transformed_query)):
+            lines = self.execute(query).splitlines()
+            if lines:
+                lines[-1] = DesWorker._without_marker(lines[-1], (b"|:", PROMPT))
+                if not lines[-1]:
+                    lines.pop()
+            return DesResult(self, None, iter(()), lines)
+
+        retries = self.retries if is_read_only(transformed_query) else 0
+
+        for attempt in range(retries + 1):
+            worker = self._acquire(self.query_timeout)
+            try:
+                logger.info("Ejecutando consulta: %s", transformed_query)
+                worker.send(transformed_query)
+                lines = worker.iter_lines(b"|:", PROMPT, timeout=self.query_timeout)
+                # Se espera a la primera línea para poder reintentar la
+                # consulta si el proceso falla antes de empezar a responder.
+                pending = [line for line in itertools.islice(lines, 1)]
+            except DesError as e:
+                logger.error("Fallo de DES ejecutando %r: %s", transformed_query, e)
+                self._respawn(worker)
+                if attempt >= retries:
+                    raise
+                logger.info("Reintentando consulta de solo lectura: %s", transformed_query)
+                continue
+
+            return DesResult(self, worker, lines, pending)
+
+    def _broadcast_setup(self, origin, command):
+        with self._cond:
+            self.setup_commands.append(command)
+
+        for worker in self._workers:
+            if worker is origin:
+                continue
+
+            # El resto de procesos aplican el comando al quedar libres; si
+            # están relanzándose lo recibirán con los comandos de sesión.
+            with self._cond:
+                while worker.busy and worker.healthy and not self._stopped.is_set():
+                    self._cond.wait()
+                if not worker.healthy or self._stopped.is_set():
+                    continue
+                worker.busy = True
+
+            try:
+                worker.execute(command, timeout=self.query_timeout)
+            except DesError as e:
+                logger.error("Fallo aplicando %r en %r: %s", command, worker, e)
+                self._respawn(worker)
+            else:
+                self._release(worker)
+
+    def _lease(self, worker):
+        # Espera a que el proceso quede libre; False si no está disponible
+        with self._cond:
+            while worker.busy and worker.healthy and not worker.rebuilding and not self._stopped.is_set():
+                self._cond.wait()
+            if not worker.healthy or worker.rebuilding or self._stopped.is_set():
+                return False
+            worker.busy = True
+            return True
+
+    def _replicate(self, command):
+        with self._write_lock:
+            # Si las instantáneas vienen fallando el registro no crece sin
+            # límite: se rechazan escrituras hasta que se pueda hacer una.
+            if len(self._log) >= self.max_log and not self._take_snapshot():
+                raise DesUnavailable('Registro de escrituras lleno y sin instantánea de DES')
+
+            with self._cond:
+                self.sequence += 1
+                sequence = self.sequence
+                # No se añade a setup_commands: al relanzar una réplica la
+                # reconstrucción ya reaplica el registro de escrituras.
+                self._log.append((sequence, command))
+
+            logger.info("Replicando escritura %s: %s", sequence, command)
+            responses = {}
+
+            # Cada réplica aplica la escritura cuando termina lo que esté
+            # haciendo; mientras tanto deja de recibir lecturas.
+            for worker in self._workers:
+                if not self._lease(worker):
+                    continue
+
+                try:
+                    responses[worker] = worker.execute(command, timeout=self.query_timeout)
+                except DesError as e:
+                    logger.error("La réplica %r no aplicó la escritura %s: %s", worker, sequence, e)
+                    self._respawn(worker)
+                else:
+                    worker.applied = sequence
+                    self._release(worker)
+
+            if not responses:
+                raise DesUnavailable('Ninguna réplica de DES aplicó la escritura')
+
+            # Vale la respuesta de la mayoría estricta. Si no la hay (p. ej.
+            # un empate 1 a 1 con dos réplicas) manda la primera réplica de la
+            # lista que respondió, que hace de primaria. Las que respondan
+            # otra cosa dejan de recibir lecturas y se reconstruyen.
+            reference, votes = collections.Counter(responses.values()).most_common(1)[0]
+            if 2 * votes <= len(responses):
+                reference = next(iter(responses.values()))
+
+            for worker, response in responses.items():
+                if response == reference:
+                    continue
+
+                logger.error("La réplica %r diverge en la escritura %s", worker, sequence)
+                with self._cond:
+                    if not worker.healthy:
+                        continue
+                    worker.applied = -1
+                    worker.diverged = True
+                    idle = not worker.busy
+                    worker.busy = True
+                if idle:
+                    self._respawn(worker)
+
+            base = self._snapshot[1] if self._snapshot is not None else 0
+            if self.sequence - base >= self.snapshot_every:
+                self._take_snapshot()
+
+        return reference
+
+    def _take_snapshot(self):
+        # Instantánea del estado de una réplica al día, que pasa a ser la
+        # base desde la que se reconstruyen las demás. Se espera a que
+        # alguna quede libre como mucho query_timeout.
+        try:
+            os.makedirs(self.snapshot_dir, exist_ok=True)
+        except OSError as e:
+            logger.error("No se pudo crear %s: %s", self.snapshot_dir, e)
+            return False
+
+        deadline = time.monotonic() + self.query_timeout
+        with self._cond:
+            while True:
+                donors = [w for w in self._workers
+                          if w.healthy and not w.rebuilding and w.applied == self.sequence]
+                idle = [w for w in donors if not w.busy]
+                if idle:
+                    donor = idle[0]
+                    donor.busy = True
+                    break
+
+                remaining = deadline - time.monotonic()
+                if not donors or remaining <= 0 or self._stopped.is_set():
+                    logger.warning("No hay réplicas libres para la instantánea de DES")
+                    return False
+                self._cond.wait(remaining)
+
+        # Ruta absoluta: un /cd anterior cambia el directorio de DES
+        path = os.path.abspath(os.path.join(self.snapshot_dir, 'pyserver-{}.sds'.format(self.sequence)))
+        try:
+            donor.execute('/save_state force {}'.format(path), timeout=self.query_timeout)
+        except DesError as e:
+            logger.error("No se pudo guardar la instantánea de %r: %s", donor, e)
+            self._respawn(donor)
+            return False
+
+        self._release(donor)
+
+        old = self._snapshot
+        self._snapshot = (path, donor.applied)
+        self._log = [(seq, command) for seq, command in self._log if seq > donor.applied]
+        if old is not None and old[0] != path:
+            try:
+                os.remove(old[0])
+            except OSError:
+                pass
+
+        logger.info("Instantánea de DES %s en la escritura %s", path, donor.applied)
+        return True
+
+    def _rebuild(self, worker):
+        with self._write_lock:
+            base = 0
+            if self._snapshot is not None:
+                path, base = self._snapshot
+                logger.info("Restaurando %r desde la instantánea %s", worker, path)
+                worker.execute('/restore_state {}'.format(path), timeout=self.query_timeout)
+
+            for sequence, command in self._log:
+                if sequence > base:
+                    worker.execute(command, timeout=self.query_timeout)
+
+            worker.applied = self.sequence
+            logger.info("Réplica %r al día en la escritura %s", worker, self.sequence)
@@ -2,6 +2,8 @@ import asyncio
 import struct
 import logging
 
+from .capture import CaptureFile, CLIENT, SERVER
+
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 
@@ -26,66 +28,113 @@ class _MysqlStreamSequence:
 
 
 class MysqlPacketReader:
-    __slots__ = '_stream', '_seq', '__length', '__follow'
+    __slots__ = '_stream', '_data', '_pos'
 
-    def __init__(self, stream, seq):
+    def __init__(self, stream):
         self._stream = stream
-        self._seq = seq
-        self.__length = 0
-        self.__follow = True
-
-    def _check_lead(self, ldata):
-        if not ldata or len(ldata) != 4:
-            raise RuntimeError
-
-        l1, l2, seq = struct.unpack("<HBB", ldata)
-        l = l1 + (l2 << 16)
-
-        self._seq.check(seq)
-
-        self.__length = l
-        if l < 0xffffff:
-            self.__follow = False
+        self._data = None
+        self._pos = 0
 
-    
     async def close(self):
-        while (await self.read()):
-            pass
+        # Si no se llegó a leer el paquete no hay nada que descartar (p. ej.
+        # el cliente cerró la conexión antes de enviarlo).
+        if self._data is not None:
+            self._pos = len(self._data)
 
-    
     async def read(self, size=None):
-        if not self.__length:
-            if self.__follow:
-                ldata = await self._stream.read(4)
-                self._check_lead(ldata)
-            else:
-                return ''
+        # El paquete completo se carga de una vez en la primera lectura y se
+        # devuelven bytes, como antes; quien quiera la memoryview sin copias
+        # usa MysqlStreamReader.read_packet().
+        if self._data is None:
+            self._data = await self._stream.read_packet()
 
-        if not size or size >= self.__length:
-            size = self.__length
+        start = self._pos
+        if not size or start + size >= len(self._data):
+            self._pos = len(self._data)
+        else:
+            self._pos = start + size
 
-        data = await self._stream.read(size)
-        self.__length -= len(data)
-        return data
+        return bytes(self._data[start:self._pos])
 
 
 class MysqlStreamReader:
-    __slots__ = '_inner', '_seq'
+    __slots__ = '_inner', '_seq', '_buffer', '_offset', '_capture'
+
+    _lead = struct.Struct("<HBB")
+    _chunk_size = 65536
 
-    def __init__(self, inner, seq):
+    def __init__(self, inner, seq, capture=None):
         self._inner = inner
         self._seq = seq
+        self._buffer = b''
+        self._offset = 0
+        self._capture = capture
 
     def packet(self):
-        return MysqlPacketReader(self._inner, self._seq)
+        return MysqlPacketReader(self)
+
+    async def _fill(self, size):
+        # Garantiza al menos size bytes pendientes en el buffer, haciendo las
+        # lecturas que hagan falta si el peer los envía a trozos.
+        while len(self._buffer) - self._offset < size:
+            chunk = await self._inner.read(max(self._chunk_size, size))
+            if not chunk:
+                pending = self._buffer[self._offset:]
+                raise asyncio.IncompleteReadError(pending, size)
+            self._buffer = self._buffer[self._offset:] + chunk
+            self._offset = 0
+
+    async def read_packet(self):
+        parts = []
+        first_seq = None
+
+        while True:
+            if len(self._buffer) - self._offset < 4:
+                await self._fill(4)
+
+            l1, l2, seq = self._lead.unpack_from(self._buffer, self._offset)
+            l = l1 + (l2 << 16)
+            self._seq.check(seq)
+            if first_seq is None:
+                first_seq = seq
+
+            if len(self._buffer) - self._offset < 4 + l and l >= self._chunk_size:
+                # Paquete grande: lo que falta del cuerpo se lee de una vez con
+                # readexactly en lugar de ir rehaciendo el buffer trozo a trozo.
+                head = self._buffer[self._offset + 4:]
+                self._buffer = b''
+                self._offset = 0
+                parts.append(memoryview(head + await self._inner.readexactly(l - len(head))))
+
+                if l < 0xffffff:
+                    break
+                continue
+
+            if len(self._buffer) - self._offset < 4 + l:
+                await self._fill(4 + l)
+
+            # Los paquetes que ya están en el buffer (pipelining) se sirven
+            # sin volver a esperar al socket.
+            start = self._offset + 4
+            self._offset = start + l
+            parts.append(memoryview(self._buffer)[start:self._offset])
+
+            if l < 0xffffff:
+                break
+
+        payload = parts[0] if len(parts) == 1 else memoryview(b''.join(parts))
+        if self._capture is not None:
+            self._capture.record(CLIENT, first_seq, payload)
+        return payload
 
 
 class MysqlStreamWriter:
-    __slots__ = '_inner', '_seq'
+    __slots__ = '_inner', '_seq', '_capture'
 
-    def __init__(self, inner, seq):
+    def __init__(self, inner, seq, capture=None):
         self._inner = inner
         self._seq = seq
+        self._capture = capture
 
     def close(self):
         self._inner.close()
@@ -101,18 +150,26 @@ class MysqlStreamWriter:
         if l >= 0xffff:
             raise NotImplementedError
 
-        ldata = struct.pack("<HBB", l, 0, self._seq.incr())
+        seq = self._seq.incr()
+        ldata = struct.pack("<HBB", l, 0, seq)
         self._inner.write(ldata + data)
 
+        if self._capture is not None:
+            self._capture.record(SERVER, seq, data)
 
 
 
-async def start_mysql_server(client_connected_cb, host='0.0.0.0', port=None, **kwds):
-    
+
+async def start_mysql_server(client_connected_cb, host='0.0.0.0', port=None, capture=None, **kwds):
+    # capture: ruta de un fichero donde grabar todos los paquetes de todas
+    # las conexiones para reproducirlos después con mysqlproto.replay.
+    capture_file = CaptureFile(capture) if capture else None
+
     async def cb(reader, writer):
         seq = _MysqlStreamSequence()
-        reader_m = MysqlStreamReader(reader, seq)
-        writer_m = MysqlStreamWriter(writer, seq)
+        connection = capture_file.connection() if capture_file else None
+        reader_m = MysqlStreamReader(reader, seq, connection)
+        writer_m = MysqlStreamWriter(writer, seq, connection)
         await client_connected_cb(reader_m, writer_m)
 
     logging.info("Iniciando el servidor en puerto %s", port)
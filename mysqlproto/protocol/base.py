@@ -5,10 +5,11 @@ from .flags import Capability, CapabilitySet, Status, StatusSet, CharacterSet
 
 
 class OK:
-    def __init__(self, capability, status, warnings=0, info=''):
+    def __init__(self, capability, status, warnings=0, info='', codec='utf-8'):
         self.status = status
         self.warnings = warnings
         self.info = info
+        self.codec = codec
 
     def write(self, stream):
         status_warnings = struct.pack('<HH', self.status.int, self.warnings)
@@ -18,7 +19,7 @@ class OK:
             b'\x00',
             b'\x00',
             status_warnings,
-            self.info.encode('ascii'),
+            self.info.encode(self.codec, 'replace'),
         ]
 
         p = b''.join(packet)
@@ -26,10 +27,11 @@ class OK:
 
 
 class ERR:
-    def __init__(self, capability, sql_state='HY000', error=1096, error_msg='Go away'):
+    def __init__(self, capability, sql_state='HY000', error=1096, error_msg='Go away', codec='utf-8'):
         self.sql_state = sql_state
         self.error = error
         self.error_msg = error_msg
+        self.codec = codec
 
     def write(self, stream):
         error = struct.pack('<H1s5s', self.error, b'#', self.sql_state.encode('ascii'))
@@ -37,7 +39,7 @@ class ERR:
         packet = [
             b'\xff',
             error,
-            self.error_msg.encode('ascii'),
+            self.error_msg.encode(self.codec, 'replace'),
         ]
 
         p = b''.join(packet)
@@ -59,3 +61,23 @@ class EOF:
 
         p = b''.join(packet)
         stream.write(p)
+
+
+class Statistics:
+    def __init__(self, uptime=0, threads=0, questions=0, slow_queries=0, opens=0, open_tables=0):
+        self.uptime = uptime
+        self.threads = threads
+        self.questions = questions
+        self.slow_queries = slow_queries
+        self.opens = opens
+        self.open_tables = open_tables
+
+    def write(self, stream):
+        qps = self.questions / self.uptime if self.uptime else 0.0
+
+        info = ('Uptime: {}  Threads: {}  Questions: {}  Slow queries: {}  Opens: {}  '
+                'Flush tables: 0  Open tables: {}  Queries per second avg: {:.3f}').format(
+            int(self.uptime), self.threads, self.questions, self.slow_queries,
+            self.opens, self.open_tables, qps)
+
+        stream.write(info.encode('ascii'))
@@ -0,0 +1,92 @@
+import collections
+import itertools
+import queue
+import struct
+import threading
+import time
+
+
+MAGIC = b'PYSCAP1\n'
+
+# Sentido de cada paquete capturado
+CLIENT = 0
+SERVER = 1
+
+CaptureRecord = collections.namedtuple('CaptureRecord', 'timestamp connection direction seq data')
+
+
+class CaptureConnection:
+    __slots__ = '_file', 'id'
+
+    def __init__(self, capture_file, id):
+        self._file = capture_file
+        self.id = id
+
+    def record(self, direction, seq, data):
+        self._file.record(self.id, direction, seq, data)
+
+
+class CaptureFile:
+    # Registro: marca de tiempo, conexión, sentido, secuencia y longitud,
+    # seguido de la carga útil del paquete.
+    _record = struct.Struct('<dIBBI')
+
+    def __init__(self, path):
+        self.path = path
+        self._queue = queue.Queue()
+        self._ids = itertools.count(1)
+
+        # La escritura en disco se hace en un hilo aparte para no bloquear el
+        # bucle de eventos.
+        self._thread = threading.Thread(target=self._writer_thread, daemon=True)
+        self._thread.start()
+
+    def connection(self):
+        return CaptureConnection(self, next(self._ids))
+
+    def record(self, connection, direction, seq, data):
+        self._queue.put((time.time(), connection, direction, seq, bytes(data)))
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def _writer_thread(self):
+        with open(self.path, 'wb') as file:
+            file.write(MAGIC)
+
+            while True:
+                item = self._queue.get()
+                batch = []
+
+                # Se agrupan los registros pendientes en una sola escritura
+                while item is not None:
+                    timestamp, connection, direction, seq, data = item
+                    batch.append(self._record.pack(timestamp, connection, direction, seq, len(data)))
+                    batch.append(data)
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+
+                file.write(b''.join(batch))
+                file.flush()
+
+                if item is None:
+                    return
+
+
+def read_capture(path):
+    size = CaptureFile._record.size
+
+    with open(path, 'rb') as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError('{} no es un fichero de captura'.format(path))
+
+        while True:
+            header = file.read(size)
+            if len(header) < size:
+                return
+
+            timestamp, connection, direction, seq, length = CaptureFile._record.unpack(header)
+            yield CaptureRecord(timestamp, connection, direction, seq, file.read(length))
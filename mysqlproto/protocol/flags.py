@@ -17,6 +17,58 @@ class Capability(Enum):
     DEPRECATE_EOF                  = 0x01000000
 
 
+class Command(Enum):
+    COM_SLEEP            = 0x00
+    COM_QUIT             = 0x01
+    COM_INIT_DB          = 0x02
+    COM_QUERY            = 0x03
+    COM_FIELD_LIST       = 0x04
+    COM_STATISTICS       = 0x09
+    COM_PING             = 0x0e
+    COM_STMT_PREPARE     = 0x16
+    COM_STMT_EXECUTE     = 0x17
+    COM_STMT_CLOSE       = 0x19
+    COM_STMT_RESET       = 0x1a
+    COM_STMT_FETCH       = 0x1c
+    COM_RESET_CONNECTION = 0x1f
+
+
+class CursorType(Enum):
+    NO_CURSOR  = 0x00
+    READ_ONLY  = 0x01
+    FOR_UPDATE = 0x02
+    SCROLLABLE = 0x04
+
+
+class FieldType(Enum):
+    DECIMAL     = 0x00
+    TINY        = 0x01
+    SHORT       = 0x02
+    LONG        = 0x03
+    FLOAT       = 0x04
+    DOUBLE      = 0x05
+    NULL        = 0x06
+    TIMESTAMP   = 0x07
+    LONGLONG    = 0x08
+    INT24       = 0x09
+    DATE        = 0x0a
+    TIME        = 0x0b
+    DATETIME    = 0x0c
+    YEAR        = 0x0d
+    VARCHAR     = 0x0f
+    BIT         = 0x10
+    NEWDECIMAL  = 0xf6
+    ENUM        = 0xf7
+    SET         = 0xf8
+    TINY_BLOB   = 0xf9
+    MEDIUM_BLOB = 0xfa
+    LONG_BLOB   = 0xfb
+    BLOB        = 0xfc
+    VAR_STRING  = 0xfd
+    STRING      = 0xfe
+    GEOMETRY    = 0xff
+
+
 class Status(Enum):
     STATUS_IN_TRANS             = 0x0001
     STATUS_AUTOCOMMIT           = 0x0002
@@ -35,8 +87,17 @@ class Status(Enum):
 
 
 class CharacterSet(Enum):
-    utf8   = 0x21
-    binary = 255 
+    latin1  = 0x08
+    utf8    = 0x21
+    utf8mb4 = 0x2d
+    binary  = 255
+
+    @property
+    def codec(self):
+        # Los clientes MySQL 8 envían 255 (utf8mb4_0900_ai_ci) como juego por defecto
+        if self is CharacterSet.latin1:
+            return 'latin-1'
+        return 'utf-8'
 
 
 class _EnumSet(set):
@@ -21,7 +21,7 @@ class HandshakeV10:
         self.status = StatusSet((
             Status.STATUS_AUTOCOMMIT,
         ))
-        self.character_set = CharacterSet.utf8
+        self.character_set = CharacterSet.utf8mb4
 
         self.auth_plugin = 'mysql_clear_password'
 
@@ -69,7 +69,10 @@ class HandshakeResponse41:
         ret.capability.int = d[0]
         ret.capability_effective = ret.capability & capability_announced
         ret.max_packet_size = d[1]
-        ret.character_set = CharacterSet(d[2])
+        try:
+            ret.character_set = CharacterSet(d[2])
+        except ValueError:
+            ret.character_set = CharacterSet.utf8mb4
 
         if not Capability.PROTOCOL_41 in ret.capability:
             raise RuntimeError
@@ -91,7 +94,7 @@ class HandshakeResponse41:
 
         if Capability.CONNECT_WITH_DB in ret.capability_effective:
             end = data.index(b'\x00', cur)
-            ret.schema = data[cur:end].decode('ascii')
+            ret.schema = data[cur:end].decode(ret.character_set.codec)
             cur = end + 1
         else:
             ret.schema = None
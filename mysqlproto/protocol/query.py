@@ -1,23 +1,35 @@
 import asyncio
 import struct
 
+from .flags import CharacterSet
 from .types import IntLengthEncoded, StringLengthEncoded
 
 
+def _encode(value, codec):
+    # Las celdas que llegan de DES ya vienen codificadas y se escriben tal
+    # cual; el resto se codifica con el juego de caracteres de la sesión.
+    if isinstance(value, bytes):
+        return value
+    return str(value).encode(codec, 'replace')
+
+
 class ColumnDefinition:
-    def __init__(self, name):
+    def __init__(self, name, table='', field_list=False, charset=CharacterSet.utf8mb4):
         self.name = name
+        self.table = table
+        self.field_list = field_list
+        self.charset = charset
 
     def write(self, stream):
         packet = [
             StringLengthEncoded.write(b'def'),
             StringLengthEncoded.write(b''),
-            StringLengthEncoded.write(b''),
-            StringLengthEncoded.write(b''),
-            StringLengthEncoded.write(self.name.encode('ascii')),
-            StringLengthEncoded.write(self.name.encode('ascii')),
+            StringLengthEncoded.write(self.table.encode(self.charset.codec, 'replace')),
+            StringLengthEncoded.write(self.table.encode(self.charset.codec, 'replace')),
+            StringLengthEncoded.write(self.name.encode(self.charset.codec, 'replace')),
+            StringLengthEncoded.write(self.name.encode(self.charset.codec, 'replace')),
             b'\x0c',
-            b'\x21\x00',
+            struct.pack('<H', self.charset.value),
             b'\x10\x00\x00\x00',
             b'\x0f',
             b'\x00\x00',
@@ -25,6 +37,10 @@ class ColumnDefinition:
             b'\x00'*2,
         ]
 
+        # Las respuestas a COM_FIELD_LIST llevan además los valores por defecto
+        if self.field_list:
+            packet.append(b'\xfb')
+
         p = b''.join(packet)
         stream.write(p)
 
@@ -43,8 +59,9 @@ class ColumnDefinitionList:
 
 
 class ResultSet:
-    def __init__(self, values):
+    def __init__(self, values, codec='utf-8'):
         self.values = values
+        self.codec = codec
 
     def write(self, stream):
         s = StringLengthEncoded.write
@@ -55,7 +72,37 @@ class ResultSet:
             if i is None:
                 packet.append(b'\xfb')
             else:
-                packet.append(s(str(i).encode('ascii')))
+                packet.append(s(_encode(i, self.codec)))
+
+        p = b''.join(packet)
+        stream.write(p)
+
+
+class BinaryResultSet:
+    def __init__(self, values, num_columns=None, codec='utf-8'):
+        self.values = values
+        self.num_columns = len(values) if num_columns is None else num_columns
+        self.codec = codec
+
+    def write(self, stream):
+        s = StringLengthEncoded.write
+
+        # El bitmap y las celdas dependen del número de columnas del
+        # resultado: las filas cortas se completan con NULL.
+        if len(self.values) > self.num_columns:
+            raise ValueError('Fila con {} valores en un resultado de {} columnas'.format(
+                len(self.values), self.num_columns))
+        values = list(self.values) + [None] * (self.num_columns - len(self.values))
+
+        # El bitmap de nulos del protocolo binario empieza en el bit 2
+        null_bitmap = bytearray((self.num_columns + 9) // 8)
+        packet = [b'\x00', null_bitmap]
+
+        for n, i in enumerate(values):
+            if i is None:
+                null_bitmap[(n + 2) // 8] |= 1 << ((n + 2) % 8)
+            else:
+                packet.append(s(_encode(i, self.codec)))
 
         p = b''.join(packet)
         stream.write(p)
@@ -0,0 +1,179 @@
+import struct
+
+from .flags import CursorType, FieldType
+from .types import StringLengthEncoded
+
+
+class StmtPrepareOK:
+    def __init__(self, statement_id, num_columns=0, num_params=0, warnings=0):
+        self.statement_id = statement_id
+        self.num_columns = num_columns
+        self.num_params = num_params
+        self.warnings = warnings
+
+    def write(self, stream):
+        packet = [
+            b'\x00',
+            struct.pack('<IHH', self.statement_id, self.num_columns, self.num_params),
+            b'\x00',
+            struct.pack('<H', self.warnings),
+        ]
+
+        p = b''.join(packet)
+        stream.write(p)
+
+
+class StmtExecute:
+    _packet_1 = struct.Struct('<IBI')
+
+    _int_types = {
+        FieldType.TINY: struct.Struct('<b'),
+        FieldType.SHORT: struct.Struct('<h'),
+        FieldType.YEAR: struct.Struct('<h'),
+        FieldType.LONG: struct.Struct('<i'),
+        FieldType.INT24: struct.Struct('<i'),
+        FieldType.LONGLONG: struct.Struct('<q'),
+        FieldType.FLOAT: struct.Struct('<f'),
+        FieldType.DOUBLE: struct.Struct('<d'),
+    }
+
+    def __init__(self):
+        self.params = []
+        self.types = []
+
+    @property
+    def cursor_type(self):
+        # None para combinaciones de flags que no son un tipo de cursor
+        try:
+            return CursorType(self.flags & 0x07)
+        except ValueError:
+            return None
+
+    @classmethod
+    def parse(cls, data, num_params, types=(), codec='utf-8'):
+        ret = cls()
+
+        ret.statement_id, ret.flags, _ = cls._packet_1.unpack_from(data)
+        cur = cls._packet_1.size
+
+        if not num_params:
+            return ret
+
+        null_bitmap = data[cur:cur + (num_params + 7) // 8]
+        cur += len(null_bitmap)
+
+        # Si el cliente no vuelve a enviar los tipos se usan los de la
+        # ejecución anterior.
+        new_params_bound = data[cur]
+        cur += 1
+        if new_params_bound:
+            ret.types = [(data[cur + 2 * i], data[cur + 2 * i + 1] & 0x80)
+                         for i in range(num_params)]
+            cur += 2 * num_params
+        else:
+            ret.types = list(types)
+
+        for i, (field_type, unsigned) in enumerate(ret.types):
+            if null_bitmap[i // 8] & (1 << (i % 8)):
+                ret.params.append(None)
+                continue
+
+            value, cur = cls._read_value(data, cur, cls._field_type(field_type), unsigned, codec)
+            ret.params.append(value)
+
+        return ret
+
+    @staticmethod
+    def _field_type(value):
+        # Los tipos que no conocemos (p. ej. JSON) se leen como cadenas
+        try:
+            return FieldType(value)
+        except ValueError:
+            return FieldType.STRING
+
+    @classmethod
+    def _read_value(cls, data, cur, field_type, unsigned, codec):
+        if field_type in cls._int_types:
+            fmt = cls._int_types[field_type]
+            if unsigned and field_type not in (FieldType.FLOAT, FieldType.DOUBLE):
+                fmt = struct.Struct(fmt.format.upper())
+            return fmt.unpack_from(data, cur)[0], cur + fmt.size
+
+        elif field_type == FieldType.NULL:
+            return None, cur
+
+        elif field_type in (FieldType.DATE, FieldType.DATETIME, FieldType.TIMESTAMP):
+            l = data[cur]
+            value = bytes(data[cur + 1:cur + 1 + l])
+            year, month, day, hour, minute, second, micro = struct.unpack(
+                '<HBBBBBI', value + b'\x00' * (11 - l))
+
+            ret = '{:04}-{:02}-{:02}'.format(year, month, day)
+            if l > 4:
+                ret += ' {:02}:{:02}:{:02}'.format(hour, minute, second)
+            if l > 7:
+                ret += '.{:06}'.format(micro)
+            return ret, cur + 1 + l
+
+        elif field_type == FieldType.TIME:
+            l = data[cur]
+            value = bytes(data[cur + 1:cur + 1 + l])
+            negative, days, hour, minute, second, micro = struct.unpack(
+                '<BIBBBI', value + b'\x00' * (12 - l))
+
+            ret = '{}{:02}:{:02}:{:02}'.format('-' if negative else '', days * 24 + hour, minute, second)
+            if l > 8:
+                ret += '.{:06}'.format(micro)
+            return ret, cur + 1 + l
+
+        else:
+            value, cur = StringLengthEncoded.read(data, cur)
+            return str(value, codec), cur
+
+
+class StmtFetch:
+    _packet_1 = struct.Struct('<II')
+
+    @classmethod
+    def parse(cls, data):
+        ret = cls()
+        ret.statement_id, ret.num_rows = cls._packet_1.unpack_from(data)
+        return ret
+
+
+def placeholders(query):
+    # Posiciones de los '?' que no están dentro de literales o identificadores
+    ret = []
+    quote = None
+
+    for n, c in enumerate(query):
+        if quote:
+            if c == quote:
+                quote = None
+        elif c in '\'"`':
+            quote = c
+        elif c == '?':
+            ret.append(n)
+
+    return ret
+
+
+def literal(value):
+    if value is None:
+        return 'NULL'
+    elif isinstance(value, (int, float)):
+        return repr(value)
+    return "'{}'".format(str(value).replace("'", "''"))
+
+
+def bind(query, params):
+    parts = []
+    last = 0
+
+    for position, value in zip(placeholders(query), params):
+        parts.append(query[last:position])
+        parts.append(literal(value))
+        last = position + 1
+
+    parts.append(query[last:])
+    return ''.join(parts)
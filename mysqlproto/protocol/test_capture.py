@@ -0,0 +1,28 @@
+import asyncio
+
+from . import MysqlStreamReader, MysqlStreamWriter, _MysqlStreamSequence
+from .capture import CaptureFile, read_capture, CLIENT, SERVER
+from .testing import Stream, Transport
+
+
+def test_capture_roundtrip(tmp_path):
+    path = str(tmp_path / 'capture.bin')
+    capture = CaptureFile(path)
+    connection = capture.connection()
+
+    async def run():
+        seq = _MysqlStreamSequence()
+        reader = MysqlStreamReader(Stream(b'\x09\x00\x00\x00\x03select 1'), seq, connection)
+        writer = MysqlStreamWriter(Transport(), seq, connection)
+        await reader.read_packet()
+        writer.write(b'\x00\x00\x00\x02\x00\x00\x00')
+    asyncio.run(run())
+
+    capture.close()
+
+    records = list(read_capture(path))
+    assert [(r.connection, r.direction, r.seq, r.data) for r in records] == [
+        (1, CLIENT, 0, b'\x03select 1'),
+        (1, SERVER, 1, b'\x00\x00\x00\x02\x00\x00\x00'),
+    ]
+    assert records[0].timestamp <= records[1].timestamp
@@ -0,0 +1,56 @@
+import struct
+
+from .flags import CursorType
+from .query import BinaryResultSet
+from .statement import StmtExecute, StmtFetch, placeholders, bind
+
+
+class Collect(list):
+    write = list.append
+
+
+def test_placeholders():
+    assert placeholders("select * from t where a = ? and b = '?' and c = ?") == [26, 48]
+
+
+def test_bind():
+    assert bind("select * from t where a = ? and b = ?", [1, "o'k"]) == "select * from t where a = 1 and b = 'o''k'"
+    assert bind("select ?", [None]) == "select NULL"
+
+
+def test_StmtExecute_parse():
+    data = (struct.pack('<IBI', 7, CursorType.READ_ONLY.value, 1) +
+            b'\x02' +                           # bitmap: segundo parámetro nulo
+            b'\x01' +                           # new_params_bound
+            b'\x08\x00\xfd\x00\x0a\x00' +
+            struct.pack('<q', -5) +
+            b'\x04\xe8\x07\x02\x1d')
+
+    stmt = StmtExecute.parse(data, 3)
+    assert stmt.statement_id == 7
+    assert stmt.cursor_type == CursorType.READ_ONLY
+    assert stmt.params == [-5, None, '2024-02-29']
+
+    again = StmtExecute.parse(struct.pack('<IBI', 7, 0, 1) + b'\x00\x00' + struct.pack('<q', 3) +
+                              b'\x01a' + b'\x00', 3, stmt.types)
+    assert again.cursor_type == CursorType.NO_CURSOR
+    assert again.params == [3, 'a', '0000-00-00']
+
+
+def test_StmtExecute_unknown_types():
+    # JSON (0xf5) se lee como cadena; los flags 3 no son un tipo de cursor
+    data = struct.pack('<IBI', 7, 3, 1) + b'\x00' + b'\x01' + b'\xf5\x00' + b'\x07{"a":1}'
+    stmt = StmtExecute.parse(data, 1)
+    assert stmt.params == ['{"a":1}']
+    assert stmt.cursor_type is None
+
+
+def test_StmtFetch_parse():
+    fetch = StmtFetch.parse(struct.pack('<II', 7, 100))
+    assert (fetch.statement_id, fetch.num_rows) == (7, 100)
+
+
+def test_BinaryResultSet_write():
+    out = Collect()
+    BinaryResultSet(('a', None, 'bc')).write(out)
+    assert out == [b'\x00\x08\x01a\x02bc']
@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+
+from . import MysqlStreamReader, _MysqlStreamSequence
+from .testing import packet, Stream
+
+
+def read_packets(stream, count):
+    async def run():
+        reader = MysqlStreamReader(stream, _MysqlStreamSequence())
+        ret = []
+        for _ in range(count):
+            ret.append(bytes(await reader.read_packet()))
+            reader._seq.reset()
+        return ret
+    return asyncio.run(run())
+
+
+def test_short_reads():
+    stream = Stream(packet(0, b'\x03select 1'), 3)
+    assert read_packets(stream, 1) == [b'\x03select 1']
+
+
+def test_pipelined():
+    stream = Stream(packet(0, b'\x0e') + packet(0, b'\x03select 1'), 1024)
+    assert read_packets(stream, 2) == [b'\x0e', b'\x03select 1']
+    assert stream.reads == 1
+
+
+def test_split_packet():
+    body = b'a' * 0xffffff + b'b'
+    stream = Stream(packet(0, body[:0xffffff]) + packet(1, body[0xffffff:]), 1 << 20)
+    assert read_packets(stream, 1) == [body]
+
+
+def test_large_packet_readexactly():
+    # El cuerpo de un paquete grande se lee de una vez, no en trozos de 64 KiB
+    body = b'a' * (8 << 20)
+    stream = Stream(packet(0, body), 65536)
+    assert read_packets(stream, 1) == [body]
+    assert stream.reads == 2
+
+
+def test_packet_reader():
+    async def run():
+        reader = MysqlStreamReader(Stream(packet(0, b'\x03abc'), 1024), _MysqlStreamSequence())
+        p = reader.packet()
+        assert await p.read(1) == b'\x03'
+        data = await p.read()
+        assert isinstance(data, bytes)
+        assert data.decode('utf-8') == 'abc'
+        assert await p.read() == b''
+    asyncio.run(run())
+
+
+def test_close_unread_packet():
+    async def run():
+        reader = MysqlStreamReader(Stream(b''), _MysqlStreamSequence())
+        with pytest.raises(asyncio.IncompleteReadError):
+            await reader.packet().read()
+        # Cerrar un paquete que no se llegó a leer no vuelve a leer
+        await reader.packet().close()
+    asyncio.run(run())
+
+
+def test_eof():
+    with pytest.raises(asyncio.IncompleteReadError):
+        read_packets(Stream(packet(0, b'\x03abc')[:5], 1024), 1)
@@ -22,3 +22,16 @@ def test_StringLengthEncoded_write():
     w = StringLengthEncoded.write
     assert w(b'')  == b'\x00'
     assert w(b'a') == b'\x01a'
+
+def test_IntLengthEncoded_read():
+    r = IntLengthEncoded.read
+    for i in (0, 250, 251, 2**16-1, 2**16, 2**24-1, 2**24, 2**64-1):
+        data = b'x' + IntLengthEncoded.write(i)
+        assert r(data, 1) == (i, len(data))
+    with pytest.raises(ValueError):
+        r(b'\xff')
+
+def test_StringLengthEncoded_read():
+    r = StringLengthEncoded.read
+    assert r(b'\x00') == (b'', 1)
+    assert r(b'\x01ab') == (b'a', 2)
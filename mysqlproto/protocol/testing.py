@@ -0,0 +1,77 @@
+import asyncio
+import struct
+
+from . import MysqlStreamReader, MysqlStreamWriter, _MysqlStreamSequence
+from .flags import Command
+
+# Utilidades comunes a las pruebas del protocolo y de los servidores
+
+
+def packet(seq, data):
+    return struct.pack('<HBB', len(data) & 0xffff, len(data) >> 16, seq) + data
+
+
+class Stream:
+    # Simula un StreamReader; con chunk devuelve lecturas cortas
+    def __init__(self, data, chunk=None):
+        self.data = data
+        self.chunk = chunk
+        self.reads = 0
+
+    async def read(self, n):
+        self.reads += 1
+        if self.chunk is not None:
+            n = min(n, self.chunk)
+        ret, self.data = self.data[:n], self.data[n:]
+        return ret
+
+    async def readexactly(self, n):
+        self.reads += 1
+        if len(self.data) < n:
+            partial, self.data = self.data, b''
+            raise asyncio.IncompleteReadError(partial, n)
+        ret, self.data = self.data[:n], self.data[n:]
+        return ret
+
+
+class Transport:
+    # Simula un StreamWriter que acumula lo escrito
+    def __init__(self):
+        self.data = b''
+
+    def write(self, data):
+        self.data += data
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def responses(data):
+    # Agrupa los paquetes de respuesta por comando (la secuencia vuelve a 1)
+    ret = []
+    while data:
+        l1, l2, seq = struct.unpack_from('<HBB', data)
+        l = l1 + (l2 << 16)
+        if seq == 1:
+            ret.append([])
+        ret[-1].append(data[4:4 + l])
+        data = data[4 + l:]
+    return ret
+
+
+def run_commands(handler, *commands, quit=True):
+    # Pasa los comandos (seguidos de COM_QUIT si quit) a handler(reader,
+    # writer) y devuelve sus respuestas agrupadas por comando.
+    if quit:
+        commands += (bytes([Command.COM_QUIT.value]),)
+
+    async def run():
+        seq = _MysqlStreamSequence()
+        transport = Transport()
+        await handler(MysqlStreamReader(Stream(b''.join(packet(0, c) for c in commands)), seq),
+                      MysqlStreamWriter(transport, seq))
+        return responses(transport.data)
+    return asyncio.run(run())
@@ -21,9 +21,28 @@ class IntLengthEncoded:
         else:
             raise ValueError
 
+    @classmethod
+    def read(cls, data, pos=0):
+        lead = data[pos]
+        if lead < 251:
+            return lead, pos + 1
+        elif lead == 0xfc:
+            return int.from_bytes(data[pos + 1:pos + 3], 'little'), pos + 3
+        elif lead == 0xfd:
+            return int.from_bytes(data[pos + 1:pos + 4], 'little'), pos + 4
+        elif lead == 0xfe:
+            return int.from_bytes(data[pos + 1:pos + 9], 'little'), pos + 9
+        else:
+            raise ValueError
+
 
 class StringLengthEncoded:
     @staticmethod
     def write(data):
         l = IntLengthEncoded.write(len(data))
         return l + data
+
+    @staticmethod
+    def read(data, pos=0):
+        l, pos = IntLengthEncoded.read(data, pos)
+        return data[pos:pos + l], pos + l
@@ -0,0 +1,208 @@
+import argparse
+import asyncio
+import collections
+import logging
+import struct
+import time
+
+from .protocol.capture import read_capture, CLIENT, SERVER
+from .protocol.flags import Command
+
+logger = logging.getLogger(__name__)
+
+
+Exchange = collections.namedtuple('Exchange', 'offset seq request responses latency label')
+
+Result = collections.namedtuple('Result', 'connection label recorded replayed')
+
+
+def _is_eof(data):
+    return data[:1] == b'\xfe' and len(data) < 9
+
+
+def _is_err(data):
+    return data[:1] == b'\xff'
+
+
+def load_exchanges(path):
+    # Agrupa la captura por conexión en intercambios petición/respuestas con
+    # su instante relativo al inicio de la captura. El saludo del servidor va
+    # en un intercambio sin petición.
+    connections = collections.OrderedDict()
+    origin = None
+
+    for record in read_capture(path):
+        if origin is None:
+            origin = record.timestamp
+
+        exchanges = connections.setdefault(record.connection, [])
+
+        if record.direction == CLIENT or not exchanges:
+            request = record.data if record.direction == CLIENT else None
+            exchanges.append([record.timestamp, record.seq, request, []])
+
+        if record.direction == SERVER:
+            exchanges[-1][3].append(record)
+
+    ret = collections.OrderedDict()
+    for connection, exchanges in connections.items():
+        ret[connection] = [
+            Exchange(timestamp - origin, seq, request, [r.data for r in responses],
+                     responses[-1].timestamp - timestamp if responses else None,
+                     # El primer paquete del cliente es el HandshakeResponse41
+                     'login' if n == 1 else describe(request))
+            for n, (timestamp, seq, request, responses) in enumerate(exchanges)
+        ]
+
+    return ret
+
+
+def describe(request):
+    if not request:
+        return 'greeting'
+
+    try:
+        command = Command(request[0])
+    except ValueError:
+        return 'command 0x{:02x}'.format(request[0])
+
+    if command in (Command.COM_QUERY, Command.COM_STMT_PREPARE):
+        return '{} {}'.format(command.name, request[1:].decode('utf-8', 'replace'))
+    return command.name
+
+
+async def _read_packet(reader):
+    parts = []
+    while True:
+        l1, l2, _ = struct.unpack('<HBB', await reader.readexactly(4))
+        l = l1 + (l2 << 16)
+        parts.append(await reader.readexactly(l))
+        if l < 0xffffff:
+            return b''.join(parts)
+
+
+def _write_packet(writer, seq, data):
+    # Los paquetes de 16 MiB o más se parten como en el protocolo original
+    while True:
+        chunk, data = data[:0xffffff], data[0xffffff:]
+        writer.write(struct.pack('<HBB', len(chunk) & 0xffff, len(chunk) >> 16, seq) + chunk)
+        seq = (seq + 1) & 0xff
+        if len(chunk) < 0xffffff:
+            return
+
+
+async def _read_response(reader, recorded):
+    # La respuesta se da por completa cuando llegan tantos EOF como en la
+    # grabación (resultados) o tantos paquetes como se grabaron (resto);
+    # un ERR la termina siempre.
+    if not recorded:
+        return
+
+    expected_eof = sum(1 for p in recorded if _is_eof(p)) if _is_eof(recorded[-1]) else None
+    count = 0
+    eofs = 0
+
+    while True:
+        data = await _read_packet(reader)
+        count += 1
+        if _is_err(data):
+            return
+        if expected_eof is not None:
+            eofs += _is_eof(data)
+            if eofs >= expected_eof:
+                return
+        elif count >= len(recorded):
+            return
+
+
+async def _wait(started, offset, speed):
+    # Se respeta el ritmo original escalado por speed
+    delay = started + offset / speed - time.monotonic()
+    if delay > 0:
+        await asyncio.sleep(delay)
+
+
+async def replay_connection(connection, exchanges, host, port, speed, started):
+    results = []
+
+    writer = None
+
+    # Un fallo de una conexión (también al abrirla) se informa y no detiene
+    # la reproducción de las demás.
+    try:
+        await _wait(started, exchanges[0].offset, speed)
+        reader, writer = await asyncio.open_connection(host, port)
+
+        for exchange in exchanges:
+            await _wait(started, exchange.offset, speed)
+
+            sent = time.monotonic()
+            if exchange.request is not None:
+                _write_packet(writer, exchange.seq, exchange.request)
+                await writer.drain()
+
+            await _read_response(reader, exchange.responses)
+            replayed = time.monotonic() - sent
+
+            if exchange.request is not None and exchange.latency is not None:
+                results.append(Result(connection, exchange.label, exchange.latency, replayed))
+
+    except (asyncio.IncompleteReadError, OSError) as e:
+        logger.error("Conexión %s cortada durante la reproducción: %s", connection, e)
+
+    finally:
+        if writer is not None:
+            writer.close()
+
+    return results
+
+
+async def replay(path, host='127.0.0.1', port=3307, speed=1.0):
+    connections = load_exchanges(path)
+    if not connections:
+        return []
+
+    # Las conexiones se abren con el mismo desfase que en la grabación
+    started = time.monotonic()
+    tasks = [
+        replay_connection(connection, exchanges, host, port, speed, started)
+        for connection, exchanges in connections.items()
+    ]
+
+    results = []
+    for ret in await asyncio.gather(*tasks):
+        results.extend(ret)
+    return results
+
+
+def report(results):
+    lines = ['{:>6} {:>12} {:>12} {:>12}  {}'.format('conn', 'grabado ms', 'replay ms', 'delta ms', 'consulta')]
+
+    for r in results:
+        lines.append('{:>6} {:>12.2f} {:>12.2f} {:>+12.2f}  {}'.format(
+            r.connection, r.recorded * 1000, r.replayed * 1000, (r.replayed - r.recorded) * 1000, r.label[:80]))
+
+    if results:
+        recorded = sum(r.recorded for r in results)
+        replayed = sum(r.replayed for r in results)
+        lines.append('{:>6} {:>12.2f} {:>12.2f} {:>+12.2f}  {} intercambios'.format(
+            'total', recorded * 1000, replayed * 1000, (replayed - recorded) * 1000, len(results)))
+
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Reproduce una captura de tráfico MySQL contra el servidor.')
+    parser.add_argument('capture', help='fichero generado con CAPTURE_FILE')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=3307)
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help='multiplicador del ritmo original (2 = el doble de rápido)')
+    args = parser.parse_args(argv)
+
+    results = asyncio.run(replay(args.capture, args.host, args.port, args.speed))
+    print(report(results))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,9 @@
 import asyncio
 import logging
+import time
 
-from .protocol.base import OK, ERR, EOF
-from .protocol.flags import Capability
+from .protocol.base import OK, ERR, EOF, Statistics
+from .protocol.flags import Capability, Command
 from .protocol.handshake import HandshakeV10, HandshakeResponse41, AuthSwitchRequest
 from .protocol.query import ColumnDefinition, ColumnDefinitionList, ResultSet
 
@@ -10,8 +11,13 @@ logger = logging.getLogger(__name__)
 
 
 class MysqlServer:
+    started = time.monotonic()
+    connections = 0
+    questions = 0
+
     def __init__(self, reader, writer):
         self.reader, self.writer = reader, writer
+        self.schema = None
 
     
     async def __iter__(self):
@@ -19,12 +25,15 @@ class MysqlServer:
 
         info = await self.do_handshake()
         await self.connection_made(*info)
+        MysqlServer.connections += 1
 
         try:
             await self.do_commands()
         except Exception as e:
             exc = e
             pass
+        finally:
+            MysqlServer.connections -= 1
 
         await self.connection_lost(exc)
 
@@ -57,6 +66,7 @@ class MysqlServer:
         result.write(self.writer)
         await self.writer.drain()
 
+        self.schema = handshake_response.schema
         return handshake_response.user, handshake_response.schema
 
     
@@ -68,15 +78,27 @@ class MysqlServer:
 
             try:
                 cmd = (await packet.read(1))[0]
+                MysqlServer.questions += 1
 
-                if cmd == 1:
+                if cmd == Command.COM_QUIT.value:
                     return
-                elif cmd == 3:
+                elif cmd == Command.COM_QUERY.value:
                     result = await self.query(packet)
+                elif cmd == Command.COM_PING.value:
+                    result = OK(self.capability, self.status)
+                elif cmd == Command.COM_INIT_DB.value:
+                    result = await self.init_db(str(await packet.read(), 'utf-8'))
+                elif cmd == Command.COM_FIELD_LIST.value:
+                    table, _, wildcard = bytes(await packet.read()).partition(b'\x00')
+                    result = await self.field_list(table.decode('utf-8'), wildcard.rstrip(b'\x00').decode('utf-8'))
+                elif cmd == Command.COM_RESET_CONNECTION.value:
+                    result = await self.reset_connection()
+                elif cmd == Command.COM_STATISTICS.value:
+                    result = self.statistics()
                 else:
                     result = ERR(self.capability)
 
-            except BrokenPipeError:
+            except (BrokenPipeError, asyncio.IncompleteReadError):
                 return
 
             except Exception as e:
@@ -98,3 +120,20 @@ class MysqlServer:
     def query(self, stream):
         raise NotImplementedError
 
+    async def init_db(self, schema):
+        self.schema = schema
+        return OK(self.capability, self.status)
+
+    async def field_list(self, table, wildcard):
+        # Las subclases escriben aquí las ColumnDefinition(..., field_list=True)
+        # de la tabla; la lista termina con el EOF devuelto.
+        return EOF(self.capability, self.status)
+
+    async def reset_connection(self):
+        return OK(self.capability, self.status)
+
+    def statistics(self):
+        return Statistics(uptime=time.monotonic() - MysqlServer.started,
+                          threads=MysqlServer.connections,
+                          questions=MysqlServer.questions)
+
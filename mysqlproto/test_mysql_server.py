@@ -0,0 +1,66 @@
+from mysqlproto.server import MysqlServer
+from mysqlproto.protocol import testing
+from mysqlproto.protocol.base import EOF
+from mysqlproto.protocol.flags import Command
+from mysqlproto.protocol.handshake import HandshakeV10
+from mysqlproto.protocol.query import ColumnDefinition
+
+
+class Server(MysqlServer):
+    tables = {'people': ['name', 'age']}
+
+    async def field_list(self, table, wildcard):
+        for name in self.tables.get(table.lower(), ()):
+            ColumnDefinition(name, table=table, field_list=True).write(self.writer)
+        return EOF(self.capability, self.status)
+
+
+def run_commands(*commands, **kw):
+    servers = []
+
+    def handler(reader, writer):
+        server = Server(reader, writer)
+        handshake = HandshakeV10()
+        server.capability, server.status = handshake.capability, handshake.status
+        servers.append(server)
+        return server.do_commands()
+
+    ret = testing.run_commands(handler, *commands, **kw)
+    return servers[0], ret
+
+
+def test_ping():
+    _, ret = run_commands(bytes([Command.COM_PING.value]))
+    assert ret == [[b'\x00\x00\x00\x02\x00\x00\x00']]
+
+
+def test_init_db_and_reset():
+    server, ret = run_commands(bytes([Command.COM_INIT_DB.value]) + b'test')
+    assert ret[0][0][0] == 0x00
+    assert server.schema == 'test'
+
+    # COM_RESET_CONNECTION conserva la base de datos actual
+    server, ret = run_commands(bytes([Command.COM_INIT_DB.value]) + b'test',
+                               bytes([Command.COM_RESET_CONNECTION.value]))
+    assert ret[1][0][0] == 0x00
+    assert server.schema == 'test'
+
+
+def test_field_list():
+    _, (cached, unknown) = run_commands(bytes([Command.COM_FIELD_LIST.value]) + b'People\x00%\x00',
+                                        bytes([Command.COM_FIELD_LIST.value]) + b'missing\x00')
+    assert len(cached) == 3
+    assert b'\x06People\x04name\x04name' in cached[0]
+    assert cached[2][0] == 0xfe
+    assert len(unknown) == 1 and unknown[0][0] == 0xfe
+
+
+def test_statistics():
+    _, ret = run_commands(bytes([Command.COM_PING.value]), bytes([Command.COM_STATISTICS.value]))
+    assert ret[1][0].startswith(b'Uptime: ')
+    assert b'Threads: 0' in ret[1][0]
+
+
+def test_disconnect_without_quit():
+    _, ret = run_commands(bytes([Command.COM_PING.value]), quit=False)
+    assert len(ret) == 1
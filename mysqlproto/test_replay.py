@@ -0,0 +1,122 @@
+import asyncio
+import socket
+import struct
+
+from mysqlproto.replay import load_exchanges, describe, replay, _read_response
+from mysqlproto.protocol.capture import CaptureFile, MAGIC, CLIENT, SERVER
+from mysqlproto.protocol.testing import packet
+
+
+OK = b'\x00\x00\x00\x02\x00\x00\x00'
+EOF = b'\xfe\x00\x00\x02\x00'
+
+
+def write_capture(path, records):
+    with open(path, 'wb') as file:
+        file.write(MAGIC)
+        for timestamp, connection, direction, seq, data in records:
+            file.write(CaptureFile._record.pack(timestamp, connection, direction, seq, len(data)))
+            file.write(data)
+
+
+def sample_capture(path):
+    write_capture(path, [
+        (100.0, 1, SERVER, 0, b'\x0a5.7.0\x00'),
+        (100.1, 1, CLIENT, 1, b'login'),
+        (100.15, 1, SERVER, 2, OK),
+        (100.5, 2, SERVER, 0, b'\x0a5.7.0\x00'),
+        (101.0, 1, CLIENT, 0, b'\x0e'),
+        (101.2, 1, SERVER, 1, OK),
+    ])
+
+
+def test_load_exchanges(tmp_path):
+    path = str(tmp_path / 'capture.bin')
+    sample_capture(path)
+
+    connections = load_exchanges(path)
+    assert list(connections) == [1, 2]
+
+    greeting, login, ping = connections[1]
+    assert (greeting.label, greeting.request, greeting.latency) == ('greeting', None, 0.0)
+    assert (login.label, login.seq, login.request, login.responses) == ('login', 1, b'login', [OK])
+    assert abs(login.offset - 0.1) < 1e-9 and abs(login.latency - 0.05) < 1e-9
+    assert (ping.label, ping.seq) == ('COM_PING', 0)
+    assert abs(ping.offset - 1.0) < 1e-9
+
+    assert [e.label for e in connections[2]] == ['greeting']
+    assert abs(connections[2][0].offset - 0.5) < 1e-9
+
+
+def test_describe():
+    assert describe(None) == 'greeting'
+    assert describe(b'\x03select 1') == 'COM_QUERY select 1'
+    assert describe(b'\x0e') == 'COM_PING'
+    assert describe(b'\x99') == 'command 0x99'
+
+
+def read_response(data, recorded):
+    async def run():
+        reader = asyncio.StreamReader()
+        reader.feed_data(data)
+        reader.feed_eof()
+        await _read_response(reader, recorded)
+        return await reader.read()
+    return asyncio.run(run())
+
+
+def test_read_response_counts_eofs():
+    # Resultado con otro número de filas que el grabado: termina en el
+    # segundo EOF y no consume lo que viene detrás.
+    recorded = [b'\x01', b'coldef', EOF, b'\x01a', EOF]
+    replayed = [b'\x01', b'coldef', EOF, b'\x01a', b'\x01b', b'\x01c', EOF]
+    data = b''.join(packet(n + 1, p) for n, p in enumerate(replayed))
+    assert read_response(data + packet(1, OK), recorded) == packet(1, OK)
+
+
+def test_read_response_counts_packets():
+    assert read_response(packet(1, OK) + packet(1, OK), [OK]) == packet(1, OK)
+
+
+def test_read_response_stops_at_err():
+    recorded = [b'\x01', b'coldef', EOF, b'\x01a', EOF]
+    err = b'\xff\x48\x04#HY000error'
+    assert read_response(packet(1, err) + packet(1, OK), recorded) == packet(1, OK)
+
+
+def test_replay(tmp_path):
+    path = str(tmp_path / 'capture.bin')
+    sample_capture(path)
+
+    async def handle(reader, writer):
+        # Servidor mínimo: saludo y un OK por cada paquete recibido
+        writer.write(packet(0, b'\x0a5.7.0\x00'))
+        try:
+            while True:
+                l1, l2, seq = struct.unpack('<HBB', await reader.readexactly(4))
+                await reader.readexactly(l1 + (l2 << 16))
+                writer.write(packet(seq + 1, OK))
+        except asyncio.IncompleteReadError:
+            writer.close()
+
+    async def run():
+        server = await asyncio.start_server(handle, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            return await replay(path, port=port, speed=10)
+
+    results = asyncio.run(run())
+    assert sorted((r.connection, r.label) for r in results) == [(1, 'COM_PING'), (1, 'login')]
+
+
+def test_replay_connection_refused(tmp_path):
+    path = str(tmp_path / 'capture.bin')
+    sample_capture(path)
+
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+
+    # Cada conexión rechazada se informa por separado, sin excepción
+    assert asyncio.run(replay(path, port=port, speed=10)) == []
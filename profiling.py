@@ -0,0 +1,146 @@
+import collections
+import logging
+import os
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class SamplingProfiler:
+    # Muestrea las pilas del hilo del bucle de eventos y de los hilos del
+    # ejecutor que están atendiendo a la conexión perfilada, durante sus
+    # próximas `queries` consultas o durante `seconds` segundos. Las muestras
+    # del bucle de eventos incluyen el trabajo de las demás conexiones que se
+    # intercale, que es justo lo que interesa ver si el bucle es el cuello de
+    # botella.
+    def __init__(self, queries=None, seconds=None, interval=0.005, directory='profiles'):
+        self.remaining = queries
+        self.deadline = time.monotonic() + seconds if seconds else None
+        self.interval = interval
+        self.directory = directory
+
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self.path = None
+
+        self._threads = {threading.get_ident()}
+        self._lock = threading.Lock()
+        self._running = threading.Event()
+        self._stopped = threading.Event()
+
+        if self.deadline is not None:
+            self._running.set()
+
+        self._thread = threading.Thread(target=self._sampler_thread, daemon=True)
+        self._thread.start()
+
+    @property
+    def finished(self):
+        return self._stopped.is_set()
+
+    def begin_query(self):
+        self._running.set()
+
+    def end_query(self):
+        if self.remaining is not None:
+            self.remaining -= 1
+            if self.remaining <= 0:
+                self.stop()
+                return
+
+        if self.deadline is None:
+            self._running.clear()
+
+    def wrap(self, fn):
+        def run(*args):
+            ident = threading.get_ident()
+            with self._lock:
+                self._threads.add(ident)
+            try:
+                return fn(*args)
+            finally:
+                with self._lock:
+                    self._threads.discard(ident)
+        return run
+
+    def stop(self):
+        # Se llama desde el bucle de eventos: el fichero lo escribe el hilo
+        # de muestreo al terminar, no quien lo para.
+        with self._lock:
+            self._stopped.set()
+            self._running.set()
+
+    def join(self, timeout=None):
+        # Espera a que el perfil esté guardado en self.path
+        self._thread.join(timeout)
+
+    @staticmethod
+    def _collapse(frame):
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append('{}:{}'.format(os.path.basename(code.co_filename), code.co_name))
+            frame = frame.f_back
+        return ';'.join(reversed(names))
+
+    def _sampler_thread(self):
+        self._sample()
+        self._dump()
+
+    def _sample(self):
+        while not self._stopped.is_set():
+            if self.deadline is not None and time.monotonic() >= self.deadline:
+                self.stop()
+                return
+
+            if not self._running.wait(0.1):
+                continue
+
+            frames = sys._current_frames()
+            with self._lock:
+                if self._stopped.is_set():
+                    return
+                for ident in self._threads:
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        self.stacks[self._collapse(frame)] += 1
+                self.samples += 1
+
+            time.sleep(self.interval)
+
+    def _dump(self):
+        # Formato "collapsed stack" (una pila por línea y su número de
+        # muestras), el que esperan flamegraph.pl y speedscope.
+        os.makedirs(self.directory, exist_ok=True)
+        self.path = os.path.join(self.directory, 'pyserver-{}-{}.folded'.format(
+            time.strftime('%Y%m%d-%H%M%S'), id(self)))
+
+        with self._lock:
+            stacks = list(self.stacks.items())
+
+        with open(self.path, 'w') as file:
+            for stack, count in stacks:
+                file.write('{} {}\n'.format(stack, count))
+
+        logger.info("Perfil guardado en %s (%s muestras)", self.path, self.samples)
+
+    def summary(self, limit=20):
+        own = collections.Counter()
+        total = collections.Counter()
+
+        with self._lock:
+            stacks = list(self.stacks.items())
+
+        for stack, count in stacks:
+            names = stack.split(';')
+            own[names[-1]] += count
+            for name in set(names):
+                total[name] += count
+
+        samples = sum(count for _, count in stacks) or 1
+        return [
+            (name, own[name], count, round(100.0 * count / samples, 1))
+            for name, count in total.most_common(limit)
+        ]
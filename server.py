@@ -1,39 +1,56 @@
 import asyncio
+import codecs
 import logging
 
 from mysqlproto.protocol import start_mysql_server
-from mysqlproto.protocol.base import OK, ERR, EOF
-from mysqlproto.protocol.flags import Capability
+from mysqlproto.protocol.base import OK, ERR, EOF, Statistics
+from mysqlproto.protocol.flags import Capability, CharacterSet, Command, CursorType, Status, StatusSet
 from mysqlproto.protocol.handshake import HandshakeV10, HandshakeResponse41, AuthSwitchRequest
-from mysqlproto.protocol.query import ColumnDefinition, ColumnDefinitionList, ResultSet
-import subprocess
-import time
-import threading
-import queue
+from mysqlproto.protocol.query import ColumnDefinition, ColumnDefinitionList, ResultSet, BinaryResultSet
+from mysqlproto.protocol.statement import StmtPrepareOK, StmtExecute, StmtFetch, placeholders, bind
 from functools import wraps
 import os
+import re
+import time
+
+from des import DesSupervisor, DesError, row_limit, push_select_limit
+from profiling import SamplingProfiler
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 
+CONF_FILE = "conf.txt"
+
+
+def read_conf():
+    conf = {}
+
+    if os.path.exists(CONF_FILE):
+        with open(CONF_FILE, "r") as file:
+            for line in file:
+                if "=" in line:
+                    key, value = line.split("=", 1)
+                    conf[key.strip()] = value.strip()
+
+    return conf
+
+
+def write_conf(conf):
+    with open(CONF_FILE, "w") as file:
+        for key, value in conf.items():
+            file.write(f"{key}={value}\n")
+
+
 def get_des_route():
-    conf_file = "conf.txt"
-    
+    conf = read_conf()
+
     # Intentar leer el archivo conf.txt
-    if os.path.exists(conf_file):
-        logging.info("Leyendo archivo de configuración: %s", conf_file)
-
-        with open(conf_file, "r") as file:
-            lines = file.readlines()
-            for line in lines:
-                if "DES_ROUTE" in line:
-                    des_route = line.split("=")[1].strip()
-                    break
-            else:
-                des_route = None
+    if conf:
+        logging.info("Leyendo archivo de configuración: %s", CONF_FILE)
     else:
-        logging.warning("Archivo de configuración %s no encontrado.", conf_file)
-        des_route = None
+        logging.warning("Archivo de configuración %s no encontrado.", CONF_FILE)
+
+    des_route = conf.get("DES_ROUTE")
 
     # Si el archivo no existe o DES_ROUTE no está en el archivo
     if not des_route:
@@ -46,116 +63,221 @@ def get_des_route():
     if not des_route.endswith("des.exe"):
         des_route += "\\des.exe"
     
-    # Guardar la ruta en conf.txt
-    with open(conf_file, "w") as file:
-        file.write(f"DES_ROUTE={des_route}\n")
+    # Guardar la ruta en conf.txt sin perder el resto de claves
+    conf["DES_ROUTE"] = des_route
+    write_conf(conf)
     
     return des_route
 
 def connect_to_des():
     des_route = get_des_route()
-    
+    conf = read_conf()
+
+    # DES_SETUP admite varios comandos de sesión separados por ';'
+    setup_commands = [c.strip() for c in conf.get("DES_SETUP", "").split(";") if c.strip()]
+
+    supervisor = DesSupervisor(
+        des_route,
+        workers=int(conf.get("DES_WORKERS", 1)),
+        query_timeout=float(conf.get("DES_QUERY_TIMEOUT", 30)),
+        probe_interval=float(conf.get("DES_PROBE_INTERVAL", 10)),
+        probe_command=conf.get("DES_PROBE", ""),
+        setup_commands=setup_commands,
+        encoding=conf.get("DES_ENCODING", "utf-8"),
+        # Con DES_REPLICATION=1 cada proceso es una réplica completa: las
+        # lecturas se reparten y las escrituras se aplican en todos. Con
+        # DES_WORKERS > 1 se activa siempre; con un solo proceso sirve para
+        # reconstruir su estado tras un fallo.
+        replicated=conf.get("DES_REPLICATION", "0") == "1",
+        snapshot_dir=conf.get("DES_SNAPSHOT_DIR", "des_snapshots"),
+        snapshot_every=int(conf.get("DES_SNAPSHOT_EVERY", 100)),
+    )
+
     try:
-        process = subprocess.Popen([des_route, "-c"],
-                                   stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        supervisor.start()
         logging.info("Conexión con DES iniciada.")
 
     except FileNotFoundError:
         logging.error("No se pudo encontrar el archivo especificado en %s", des_route)
+        supervisor.stop()
         # Borrar la ruta incorrecta y pedir al usuario que ingrese una nueva
-        os.remove("conf.txt")
+        del conf["DES_ROUTE"]
+        write_conf(conf)
         return connect_to_des()
-    
-    output_queue = queue.Queue()
 
+    return supervisor
 
-    def reader_thread(p, q):
-        while True:
-            char = p.stdout.read(1)
-            if not char:
-                break
-            q.put(char)
-    
-    threading.Thread(target=reader_thread, args=(process, output_queue), daemon=True).start()
-    
-    # Limpia el mensaje inicial
-    logging.info("Limpiando mensaje incial de DES...")
-
-    read_until_markerInitialMessage(output_queue, "DES>")
-    
-    return process, output_queue
-
-def parse_des_response(des_result):
-    lines = des_result.splitlines()
+def parse_des_response(lines):
     if not lines:
         return False, []
 
     # Separar cada línea por el delimitador para obtener las columnas
-    rows = [line.split(' | ') for line in lines]
+    rows = [line.split(b' | ') for line in lines]
     
     return True, rows
 
 
-def read_until_markerInitialMessage(q, marker, timeout=10):
-    end_time = time.time() + timeout
-    buffer = ''
-    marker_detected = False
-
-    # Leemos primero un gran trozo del buffer antes de comenzar la búsqueda.
-    while len(buffer) < 50000 and time.time() < end_time:  # Ajusta el 50000 si es necesario.
-        try:
-            char = q.get(timeout=0.1)
-            buffer += char
-        except queue.Empty:
-            continue
-
-    # Ahora buscamos el marcador en el buffer.
-    while time.time() < end_time:
-        try:
-            char = q.get(timeout=0.1)
-            buffer += char
-        except queue.Empty:
-            continue
-
-        if marker in buffer and not marker_detected: # Si el marcador está en el buffer y no lo hemos detectado antes
-            des_index = buffer.find(marker)
-
-            after_des = buffer[des_index + len(marker):]
-            if '/restore_state' in after_des: 
-                marker_detected = True
-                return buffer
-            elif marker in after_des:   # Si hay otro marcador en el buffer, lo ignoramos
-                marker_detected = True
-                return buffer
+# Metadatos de columnas de las últimas consultas a cada tabla, para responder
+# a COM_FIELD_LIST sin consultar a DES.
+column_cache = {}
+
+_single_table = re.compile(r"\s*select\s.+?\sfrom\s+([A-Za-z_]\w*)\s*(?:where\s.*|order\s.*|group\s.*|limit\s.*|;)?$",
+                           re.IGNORECASE | re.DOTALL)
+
+_set_names = re.compile(r"\s*set\s+names\s+'?(\w+)'?", re.IGNORECASE)
+
+# Sentencias reservadas para perfilar la conexión sin reiniciar el conector:
+#   SET @pyserver_profile = N          perfila las próximas N consultas (0 para)
+#   SET @pyserver_profile_seconds = T  perfila durante T segundos
+#   SELECT @pyserver_profile           funciones más costosas del último perfil
+_set_profile = re.compile(r"\s*set\s+@pyserver_profile(_seconds)?\s*=\s*(\d+(?:\.\d+)?)\s*;?\s*$", re.IGNORECASE)
+_select_profile = re.compile(r"\s*select\s+@pyserver_profile\s*;?\s*$", re.IGNORECASE)
+
+_set_select_limit = re.compile(r"\s*set\s+(?:@@(?:session\.)?|session\s+)?sql_select_limit\s*=\s*(\d+|default)\s*;?\s*$",
+                               re.IGNORECASE)
+
+server_started = time.monotonic()
+server_stats = {"threads": 0, "questions": 0}
+
+# Directorio de los perfiles; se lee de conf.txt (PROFILE_DIR) al arrancar
+profile_dir = "profiles"
+
+
+class Cursor:
+    def __init__(self, des_result, limit=None):
+        self.des_result = des_result
+        self.remaining = limit
+        self.num_columns = None
+        self.pending = []
+
+    @property
+    def exhausted(self):
+        return not self.pending and (self.des_result.exhausted or self.remaining == 0)
+
+    def peek(self):
+        if not self.pending and not self.des_result.exhausted:
+            self.pending.extend(self.des_result.fetch(1))
+        return self.pending[0] if self.pending else None
+
+    def fetch(self, size=None):
+        if self.remaining is not None:
+            size = self.remaining if size is None else min(size, self.remaining)
+
+        # Se lee una fila de más para saber si tras este lote quedan filas
+        if size is None:
+            self.pending.extend(self.des_result.fetch())
+        elif size + 1 > len(self.pending) and not self.des_result.exhausted:
+            self.pending.extend(self.des_result.fetch(size + 1 - len(self.pending)))
+
+        rows, self.pending = self.pending[:size], self.pending[len(self.pending) if size is None else size:]
+
+        if self.remaining is not None:
+            self.remaining -= len(rows)
+            if not self.remaining:
+                self.pending = []
+        return rows
+
+    def spool(self):
+        # Lo que queda del resultado pasa a un fichero temporal para
+        # devolver el proceso DES mientras el cliente pide lotes.
+        limit = None if self.remaining is None else max(self.remaining - len(self.pending), 0)
+        self.des_result.spool(limit)
+
+    def close(self):
+        self.pending = []
+        if not self.des_result.closed:
+            asyncio.get_running_loop().run_in_executor(None, self.des_result.close)
+
+
+class Statement:
+    def __init__(self, statement_id, query):
+        self.statement_id = statement_id
+        self.query = query
+        self.num_params = len(placeholders(query))
+        self.types = []
+        self.cursor = None
+
+    def close_cursor(self):
+        if self.cursor is not None:
+            self.cursor.close()
+            self.cursor = None
+
+
+class Session:
+    def __init__(self, schema=None, charset=CharacterSet.utf8mb4):
+        self.schema = schema
+        self.charset = charset
+        self.handshake_charset = charset
+        self.select_limit = None
+        self.statements = {}
+        self.last_statement_id = 0
+        self.profiler = None
+
+    def reset(self):
+        # COM_RESET_CONNECTION conserva la base de datos actual y descarta el
+        # resto del estado de la sesión.
+        self.charset = self.handshake_charset
+        self.select_limit = None
+        self.close_statements()
+        self.stop_profile()
+
+    def close(self):
+        self.close_statements()
+        self.stop_profile()
+
+    def start_profile(self, queries=None, seconds=None):
+        self.stop_profile()
+        self.profiler = SamplingProfiler(queries=queries, seconds=seconds, directory=profile_dir)
+
+    def stop_profile(self):
+        if self.profiler is not None:
+            self.profiler.stop()
+
+    def active_profiler(self, cmd, payload):
+        # Solo cuentan las consultas que llegan a DES, no las de control
+        if self.profiler is None or self.profiler.finished:
+            return None
+        if cmd == Command.COM_QUERY.value:
+            if b'@pyserver_profile' in bytes(payload[1:40]):
+                return None
+        elif cmd not in (Command.COM_STMT_EXECUTE.value, Command.COM_STMT_FETCH.value):
+            return None
+        return self.profiler
+
+    def transcode(self, rows):
+        # DES escribe en DES_ENCODING y el cliente espera el juego de
+        # caracteres negociado o el de SET NAMES; si coinciden las celdas
+        # pasan tal cual.
+        source = codecs.lookup(supervisor.encoding).name
+        target = codecs.lookup(self.charset.codec).name
+        if source == target:
+            return rows
+        return [[cell.decode(source, 'replace').encode(target, 'replace') for cell in row] for row in rows]
+
+    def run_in_executor(self, fn, *args):
+        # Con un perfil activo también se muestrea el hilo del ejecutor
+        if self.profiler is not None and not self.profiler.finished:
+            fn = self.profiler.wrap(fn)
+        return asyncio.get_running_loop().run_in_executor(None, fn, *args)
+
+    def close_statements(self):
+        # Los cursores abiertos retienen su fichero temporal hasta que se cierran
+        for statement in self.statements.values():
+            statement.close_cursor()
+        self.statements.clear()
+
+    def set_select_limit(self, value):
+        # DEFAULT y el máximo de MySQL (2**64-1) equivalen a no tener límite
+        if value.lower() == 'default' or int(value) >= 2**63:
+            self.select_limit = None
+        else:
+            self.select_limit = int(value)
 
-    return None
 
-
-def read_until_marker(q, *markers):
-    buffer = ''
-    while True:
-        try:
-            char = q.get(timeout=0.1)
-            buffer += char
-            if any(marker in buffer[-len(marker):] for marker in markers):
-                break
-        except queue.Empty:
-            break  # Salimos inmediatamente si no hay más datos en la cola.
-    return buffer
-
-
-def execute_des_query(process, q, query):
-    if "/" in query:
-        transformed_query = query
-    else:
-        transformed_query = "/tapi " + query
-        
-    logging.info("Ejecutando consulta: %s", transformed_query)
-    process.stdin.write(transformed_query + '\n')
-    process.stdin.flush()
-    
-    response = read_until_marker(q, "|:", "DES>")
-    return response
+def cache_columns(query, column_names):
+    match = _single_table.match(query)
+    if match:
+        column_cache[match.group(1).lower()] = list(column_names)
 
 
 async def accept_server(server_reader, server_writer):
@@ -187,82 +309,315 @@ async def handle_server(server_reader, server_writer):
     result.write(server_writer)
     await server_writer.drain()
 
+    session = Session(handshake_response.schema, handshake_response.character_set)
+    server_stats["threads"] += 1
+    try:
+        await handle_commands(server_reader, server_writer, handshake, capability, session)
+    finally:
+        session.close()
+        server_stats["threads"] -= 1
+
+
+async def execute_statement(server_writer, handshake, capability, session, statement, query, cursor_type):
+    limit = row_limit(query, session.select_limit)
+
+    try:
+        des_result = await session.run_in_executor(
+            supervisor.open, push_select_limit(query, session.select_limit))
+        cursor = Cursor(des_result, limit)
+        first = await session.run_in_executor(cursor.peek)
+        if cursor_type == CursorType.READ_ONLY:
+            await session.run_in_executor(cursor.spool)
+    except DesError as e:
+        logging.error("DES no disponible: %s", e)
+        return ERR(capability, error_msg='DES no disponible: {}'.format(e.__class__.__name__),
+                   codec=session.charset.codec)
+
+    if first is None:
+        cursor.close()
+        return ERR(capability, error_msg='Mensaje de error personalizado', codec=session.charset.codec)
+
+    num_columns = cursor.num_columns = len(first.split(b' | '))
+    ColumnDefinitionList([ColumnDefinition(f"column_{i+1}", charset=session.charset)
+                          for i in range(num_columns)]).write(server_writer)
+
+    # Con cursor solo se envían las columnas; las filas llegan con COM_STMT_FETCH
+    if cursor_type == CursorType.READ_ONLY:
+        statement.cursor = cursor
+        status = StatusSet(handshake.status)
+        status.add(Status.STATUS_CURSOR_EXISTS)
+        return EOF(capability, status)
+
+    EOF(capability, handshake.status).write(server_writer)
+
+    try:
+        lines = await session.run_in_executor(cursor.fetch)
+    except DesError as e:
+        logging.error("DES no disponible: %s", e)
+        return ERR(capability, error_msg='DES no disponible: {}'.format(e.__class__.__name__),
+                   codec=session.charset.codec)
+    finally:
+        cursor.close()
+
+    for row in session.transcode(parse_des_response(lines)[1]):
+        BinaryResultSet(row, num_columns).write(server_writer)
+    return EOF(capability, handshake.status)
+
+
+async def handle_commands(server_reader, server_writer, handshake, capability, session):
     while True:
         server_writer.reset()
-        packet = server_reader.packet()
-        cmd = (await packet.read(1))[0]
+        try:
+            payload = await server_reader.read_packet()
+        except asyncio.IncompleteReadError:
+            logging.info("Cliente desconectado sin COM_QUIT.")
+            return
+        cmd = payload[0]
         # print("<=", cmd)
+        server_stats["questions"] += 1
 
-        if cmd == 1:
-            logging.info("Cliente desconectado.")
-            return
+        profiler = session.active_profiler(cmd, payload)
+        if profiler is not None:
+            profiler.begin_query()
+
+        # Un paquete que no se sabe interpretar se responde con ERR en lugar
+        # de cerrar la conexión sin respuesta.
+        try:
+            if cmd == Command.COM_QUIT.value:
+                logging.info("Cliente desconectado.")
+                return
 
-        elif cmd == 3:
-            query = (await packet.read()).decode('ascii')
-            
-
-            # Filtra las consultas no deseadas
-            mysql_specific_commands = [
-                "SET NAMES",
-                "SET character_set_results",
-                "SET SQL_AUTO_IS_NULL",
-                "SET AUTOCOMMIT",
-                "set @@sql_select_limit",
-                "SELECT TABLE_NAME,TABLE_COMMENT,IF(TABLE_TYPE='BASE TABLE', 'TABLE', TABLE_TYPE),TABLE_SCHEMA FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_SCHEMA=DATABASE() AND ( TABLE_TYPE='BASE TABLE' OR TABLE_TYPE='VIEW' )  ORDER BY TABLE_SCHEMA, TABLE_NAME",
-                "SELECT TABLE_NAME, TABLE_COMMENT, TABLE_TYPE, TABLE_SCHEMA FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_SCHEMA = DATABASE() AND ( TABLE_TYPE='BASE TABLE' OR TABLE_TYPE='VIEW' )"
-                "ROLLBACK"
-
-            ]
-            if any(command in query for command in mysql_specific_commands) or query.startswith("SELECT TABLE_NAME,"):
-                # No enviar a DES, tal vez responder con un paquete de éxito falso
+            elif cmd == Command.COM_PING.value:
                 result = OK(capability, handshake.status)
-            
-            elif query == 'select 1':
-                logging.info("Consulta recibida en select 1: %s", query)
-                ColumnDefinitionList((ColumnDefinition('database'),)).write(server_writer)
-                EOF(capability, handshake.status).write(server_writer)
-                ResultSet(('test',)).write(server_writer)
+
+            elif cmd == Command.COM_INIT_DB.value:
+                session.schema = str(payload[1:], session.charset.codec)
+                result = OK(capability, handshake.status)
+
+            elif cmd == Command.COM_FIELD_LIST.value:
+                table = bytes(payload[1:]).partition(b'\x00')[0].decode(session.charset.codec)
+                for name in column_cache.get(table.lower(), ()):
+                    ColumnDefinition(name, table=table, field_list=True, charset=session.charset).write(server_writer)
                 result = EOF(capability, handshake.status)
 
-            else:
-                logging.info("Consulta recibida en else: %s", query)
-                # Reenvía la consulta a DES
-                des_result = execute_des_query(process, output_queue, query)
-                logging.info("Result from DES: %s", des_result)
-                success, data = parse_des_response(des_result)
-                if success:
-                    num_columns = len(data[0])
-                    column_definitions = [ColumnDefinition(f"column_{i+1}") for i in range(num_columns)]
-                    ColumnDefinitionList(column_definitions).write(server_writer)
-                    EOF(capability, handshake.status).write(server_writer)
+            elif cmd == Command.COM_RESET_CONNECTION.value:
+                session.reset()
+                result = OK(capability, handshake.status)
 
-                    # Envío de las filas
-                    for row in data:
-                        ResultSet(row).write(server_writer)
+            elif cmd == Command.COM_STMT_PREPARE.value:
+                session.last_statement_id += 1
+                statement = Statement(session.last_statement_id, str(payload[1:], session.charset.codec))
+                session.statements[statement.statement_id] = statement
+
+                # Las columnas del resultado no se conocen sin ejecutar la consulta
+                # en DES; el cliente las recibe con COM_STMT_EXECUTE.
+                StmtPrepareOK(statement.statement_id, num_params=statement.num_params).write(server_writer)
+                if statement.num_params:
+                    for _ in range(statement.num_params):
+                        ColumnDefinition('?').write(server_writer)
                     result = EOF(capability, handshake.status)
+                else:
+                    result = None
 
+            elif cmd == Command.COM_STMT_EXECUTE.value:
+                statement = session.statements.get(int.from_bytes(payload[1:5], 'little'))
+                if statement is None:
+                    result = ERR(capability, error=1243, error_msg='Unknown prepared statement handler',
+                                 codec=session.charset.codec)
+                else:
+                    execute = StmtExecute.parse(payload[1:], statement.num_params, statement.types,
+                                                session.charset.codec)
+                    statement.types = execute.types
+                    statement.close_cursor()
+                    if execute.cursor_type not in (CursorType.NO_CURSOR, CursorType.READ_ONLY):
+                        result = ERR(capability, error=1235, error_msg='Solo se admiten cursores de solo lectura',
+                                     codec=session.charset.codec)
+                    else:
+                        result = await execute_statement(server_writer, handshake, capability, session, statement,
+                                                             bind(statement.query, execute.params),
+                                                         execute.cursor_type)
+
+            elif cmd == Command.COM_STMT_FETCH.value:
+                fetch = StmtFetch.parse(payload[1:])
+                statement = session.statements.get(fetch.statement_id)
+                if statement is None or statement.cursor is None:
+                    result = ERR(capability, error=1421, error_msg='The statement has no open cursor',
+                                 codec=session.charset.codec)
+                else:
+                    cursor = statement.cursor
+                    try:
+                        lines = await session.run_in_executor(cursor.fetch, fetch.num_rows)
+                    except DesError as e:
+                        logging.error("DES no disponible: %s", e)
+                        statement.cursor = None
+                        result = ERR(capability, error_msg='DES no disponible: {}'.format(e.__class__.__name__),
+                                     codec=session.charset.codec)
+                    else:
+                        for row in session.transcode(parse_des_response(lines)[1]):
+                            BinaryResultSet(row, cursor.num_columns).write(server_writer)
+
+                        status = StatusSet(handshake.status)
+                        if cursor.exhausted:
+                            statement.close_cursor()
+                            status.add(Status.STATUS_LAST_ROW_SENT)
+                        else:
+                            status.add(Status.STATUS_CURSOR_EXISTS)
+                        result = EOF(capability, status)
+
+            elif cmd == Command.COM_STMT_RESET.value:
+                statement = session.statements.get(int.from_bytes(payload[1:5], 'little'))
+                if statement is None:
+                    result = ERR(capability, error=1243, error_msg='Unknown prepared statement handler',
+                                 codec=session.charset.codec)
                 else:
-                    logging.info("Consulta recibida: %s", query)
-                    result = ERR(capability, error_msg='Mensaje de error personalizado')
+                    statement.close_cursor()
+                    result = OK(capability, handshake.status)
+
+            elif cmd == Command.COM_STMT_CLOSE.value:
+                # COM_STMT_CLOSE no tiene respuesta
+                statement = session.statements.pop(int.from_bytes(payload[1:5], 'little'), None)
+                if statement is not None:
+                    statement.close_cursor()
+                result = None
+
+            elif cmd == Command.COM_STATISTICS.value:
+                result = Statistics(uptime=time.monotonic() - server_started,
+                                    threads=server_stats["threads"],
+                                    questions=server_stats["questions"],
+                                    open_tables=len(column_cache))
+
+            elif cmd == Command.COM_QUERY.value:
+                # Único paso de decodificación: con el juego de caracteres negociado
+                query = str(payload[1:], session.charset.codec)
+
+
+                # Filtra las consultas no deseadas
+                mysql_specific_commands = [
+                    "SET NAMES",
+                    "SET character_set_results",
+                    "SET SQL_AUTO_IS_NULL",
+                    "SET AUTOCOMMIT",
+                    "set @@sql_select_limit",
+                    "SELECT TABLE_NAME,TABLE_COMMENT,IF(TABLE_TYPE='BASE TABLE', 'TABLE', TABLE_TYPE),TABLE_SCHEMA FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_SCHEMA=DATABASE() AND ( TABLE_TYPE='BASE TABLE' OR TABLE_TYPE='VIEW' )  ORDER BY TABLE_SCHEMA, TABLE_NAME",
+                    "SELECT TABLE_NAME, TABLE_COMMENT, TABLE_TYPE, TABLE_SCHEMA FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_SCHEMA = DATABASE() AND ( TABLE_TYPE='BASE TABLE' OR TABLE_TYPE='VIEW' )"
+                    "ROLLBACK"
+
+                ]
+                select_limit = _set_select_limit.match(query)
+                set_names = _set_names.match(query)
+                set_profile = _set_profile.match(query)
+                if set_profile:
+                    value = float(set_profile.group(2))
+                    if not value:
+                        session.stop_profile()
+                    elif set_profile.group(1):
+                        session.start_profile(seconds=value)
+                    else:
+                        session.start_profile(queries=int(value))
+                    result = OK(capability, handshake.status)
+
+                elif _select_profile.match(query):
+                    if session.profiler is None:
+                        result = ERR(capability, error_msg='No hay ningún perfil; use SET @pyserver_profile = N',
+                                     codec=session.charset.codec)
+                    else:
+                        columns = ('funcion', 'muestras_propias', 'muestras_totales', 'porcentaje')
+                        ColumnDefinitionList([ColumnDefinition(c, charset=session.charset)
+                                              for c in columns]).write(server_writer)
+                        EOF(capability, handshake.status).write(server_writer)
+                        for row in session.profiler.summary():
+                            ResultSet(row, codec=session.charset.codec).write(server_writer)
+                        result = EOF(capability, handshake.status)
+
+                elif select_limit:
+                    session.set_select_limit(select_limit.group(1))
+                    result = OK(capability, handshake.status)
+
+                elif set_names and set_names.group(1).lower() in CharacterSet.__members__:
+                    session.charset = CharacterSet[set_names.group(1).lower()]
+                    result = OK(capability, handshake.status)
+
+                elif any(command in query for command in mysql_specific_commands) or query.startswith("SELECT TABLE_NAME,"):
+                    # No enviar a DES, tal vez responder con un paquete de éxito falso
+                    result = OK(capability, handshake.status)
+
+                elif query == 'select 1':
+                    logging.info("Consulta recibida en select 1: %s", query)
+                    ColumnDefinitionList((ColumnDefinition('database', charset=session.charset),)).write(
+                        server_writer)
+                    EOF(capability, handshake.status).write(server_writer)
+                    ResultSet(('test',), codec=session.charset.codec).write(server_writer)
+                    result = EOF(capability, handshake.status)
 
-        else:
-            result = ERR(capability)
+                else:
+                    logging.info("Consulta recibida en else: %s", query)
+                    limit = row_limit(query, session.select_limit)
+
+                    # Reenvía la consulta a DES sin bloquear el bucle de eventos
+                    try:
+                        des_result = await session.run_in_executor(
+                            supervisor.open, push_select_limit(query, session.select_limit))
+                        # Con LIMIT 0 se lee una línea para conocer las columnas
+                        lines = await session.run_in_executor(
+                            des_result.fetch, None if limit is None else max(limit, 1))
+                    except DesError as e:
+                        logging.error("DES no disponible: %s", e)
+                        result = ERR(capability, error_msg='DES no disponible: {}'.format(e.__class__.__name__),
+                                     codec=session.charset.codec)
+                    else:
+                        # Alcanzado el límite, el resto de la salida se descarta
+                        # en segundo plano sin parsear ni codificar filas.
+                        if not des_result.closed:
+                            asyncio.get_running_loop().run_in_executor(None, des_result.close)
+
+                        logging.info("Result from DES: %s", lines)
+                        success, data = parse_des_response(lines)
+                        if success:
+                            num_columns = len(data[0])
+                            column_definitions = [ColumnDefinition(f"column_{i+1}", charset=session.charset)
+                                                  for i in range(num_columns)]
+                            cache_columns(query, (c.name for c in column_definitions))
+                            ColumnDefinitionList(column_definitions).write(server_writer)
+                            EOF(capability, handshake.status).write(server_writer)
+
+                            # Envío de las filas
+                            for row in session.transcode(data[:limit]):
+                                ResultSet(row).write(server_writer)
+                            result = EOF(capability, handshake.status)
+
+                        else:
+                            logging.info("Consulta recibida: %s", query)
+                            result = ERR(capability, error_msg='Mensaje de error personalizado',
+                                         codec=session.charset.codec)
 
-        result.write(server_writer)
-        await server_writer.drain()
+            else:
+                result = ERR(capability, codec=session.charset.codec)
 
+        except Exception as e:
+            logging.exception("Error atendiendo el comando %s", cmd)
+            result = ERR(capability, error_msg='{}: {}'.format(e.__class__.__name__, e),
+                         codec=session.charset.codec)
 
-# logging.basicConfig(level=logging.INFO)
-port = 3307
+        if result is not None:
+            result.write(server_writer)
+        await server_writer.drain()
 
-try:
-    loop = asyncio.get_event_loop()
-    loop.run_until_complete(start_mysql_server(handle_server, host=None, port=port))
-    logging.info("Servidor iniciado en el puerto: %s", port)
+        if profiler is not None:
+            profiler.end_query()
 
-    process, output_queue = connect_to_des()
-    loop.run_forever()
-except Exception as e:
-    logging.exception("Error while starting the server: %s", e)
 
+if __name__ == '__main__':
+    # logging.basicConfig(level=logging.INFO)
+    port = 3307
 
+    try:
+        loop = asyncio.get_event_loop()
+        loop.run_until_complete(start_mysql_server(handle_server, host=None, port=port,
+                                                   capture=read_conf().get("CAPTURE_FILE")))
+        logging.info("Servidor iniciado en el puerto: %s", port)
+
+        profile_dir = read_conf().get("PROFILE_DIR", profile_dir)
+        supervisor = connect_to_des()
+        loop.run_forever()
+    except Exception as e:
+        logging.exception("Error while starting the server: %s", e)
@@ -0,0 +1,355 @@
+import stat
+import sys
+import threading
+import time
+
+import pytest
+
+from des import (DesSupervisor, DesCrashed, DesTimeout, is_read_only, is_setup_command,
+                 is_write, row_limit, push_select_limit)
+
+
+FAKE_DES = '''#!{python}
+import sys, time
+
+out = sys.stdout.buffer
+out.write(b"Datalog Educational System\\nDES> ")
+out.flush()
+facts = []
+for line in sys.stdin.buffer:
+    line = line.strip()
+    if line.startswith(b"/assert "):
+        facts.append(line[8:])
+        out.write(b"Info: Fact asserted (%d).\\r\\n" % len(facts))
+    elif line == b"/tapi select facts":
+        out.write(b"answer(" + b",".join(facts) + b")\\r\\n")
+    elif line.startswith(b"/save_state force "):
+        open(line[18:], "wb").write(b"\\n".join(facts))
+    elif line.startswith(b"/restore_state "):
+        facts = [f for f in open(line[15:], "rb").read().split(b"\\n") if f]
+    elif line == b"/tapi select slow":
+        out.write(b"row1\\r\\n")
+        out.flush()
+        time.sleep(0.5)
+        out.write(b"row2\\r\\n")
+    elif line == b"/tapi hang":
+        time.sleep(60)
+    elif line == b"/tapi crash" or line == b"/tapi select crash":
+        sys.exit(1)
+    elif line:
+        out.write(line + b"\\r\\n")
+    out.write(b"DES> ")
+    out.flush()
+'''
+
+
+@pytest.fixture
+def fake_des(tmp_path):
+    path = tmp_path / 'des.exe'
+    path.write_text(FAKE_DES.format(python=sys.executable))
+    path.chmod(path.stat().st_mode | stat.S_IEXEC)
+    return str(path)
+
+
+def wait_healthy(supervisor, timeout=10):
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        if all(w.healthy and not w.busy for w in supervisor.workers):
+            return
+        time.sleep(0.05)
+    raise AssertionError('workers did not recover')
+
+
+def test_classification():
+    assert is_read_only('/tapi select * from t')
+    assert is_read_only('SELECT 1')
+    assert not is_read_only('/assert p(1)')
+    assert not is_read_only('/tapi insert into t values (1)')
+    assert is_setup_command('/consult data.dl')
+    assert not is_setup_command('/tapi select * from t')
+    assert is_write('/assert p(1)')
+    assert is_write('/tapi  UPDATE t set a=1')
+    assert not is_write('/tapi select * from t')
+    assert is_write("insert into t values ('a/b')")
+    assert is_write('delete from t where a = 4/2')
+    assert is_write('/sql insert into t values (1)')
+    assert not is_write('select a/2 from t')
+    assert is_read_only('/sql select * from t')
+
+
+def test_execute(fake_des):
+    supervisor = DesSupervisor(fake_des, probe_interval=60)
+    supervisor.start()
+    try:
+        assert supervisor.execute('select 1').startswith(b'/tapi select 1\r\n')
+    finally:
+        supervisor.stop()
+
+
+def test_hang_respawn(fake_des):
+    supervisor = DesSupervisor(fake_des, query_timeout=0.5, probe_interval=60)
+    supervisor.start()
+    try:
+        with pytest.raises(DesTimeout):
+            supervisor.execute('hang')
+        wait_healthy(supervisor)
+        assert supervisor.workers[0].restarts == 1
+        assert b'select 2' in supervisor.execute('select 2')
+    finally:
+        supervisor.stop()
+
+
+def test_slow_output_is_not_end(fake_des):
+    supervisor = DesSupervisor(fake_des, query_timeout=5, probe_interval=60)
+    supervisor.start()
+    try:
+        # Una pausa a mitad de la salida no termina la respuesta
+        assert supervisor.execute('select slow') == b'row1\r\nrow2\r\nDES>'
+        assert supervisor.open('select slow').fetch() == [b'row1', b'row2']
+        assert supervisor.execute('select 1').startswith(b'/tapi select 1\r\n')
+    finally:
+        supervisor.stop()
+
+
+def test_slow_output_timeout(fake_des):
+    supervisor = DesSupervisor(fake_des, query_timeout=0.3, probe_interval=60, retries=0)
+    supervisor.start()
+    try:
+        with pytest.raises(DesTimeout):
+            supervisor.execute('select slow')
+        wait_healthy(supervisor)
+        assert supervisor.workers[0].restarts == 1
+        assert supervisor.execute('select 1').startswith(b'/tapi select 1\r\n')
+    finally:
+        supervisor.stop()
+
+
+def test_crash_replays_setup(fake_des):
+    supervisor = DesSupervisor(fake_des, probe_interval=60, setup_commands=['/cd data'])
+    supervisor.start()
+    try:
+        supervisor.execute('/consult facts.dl')
+        with pytest.raises(DesCrashed):
+            supervisor.execute('crash')
+        wait_healthy(supervisor)
+        assert supervisor.setup_commands == ['/cd data', '/consult facts.dl']
+        assert supervisor.workers[0].setup_commands == supervisor.setup_commands
+    finally:
+        supervisor.stop()
+
+
+def test_read_only_retry(fake_des):
+    supervisor = DesSupervisor(fake_des, workers=2, probe_interval=60)
+    supervisor.start()
+    try:
+        # La consulta de solo lectura se reintenta en otro proceso; como el
+        # falso DES vuelve a caerse, se agotan los reintentos.
+        with pytest.raises(DesCrashed):
+            supervisor.execute('select crash')
+        wait_healthy(supervisor)
+        assert sum(w.restarts for w in supervisor.workers) == 2
+    finally:
+        supervisor.stop()
+
+
+def test_probe_detects_dead_worker(fake_des):
+    supervisor = DesSupervisor(fake_des, probe_interval=0.2)
+    supervisor.start()
+    try:
+        supervisor.workers[0].process.kill()
+        time.sleep(1)
+        wait_healthy(supervisor)
+        assert supervisor.workers[0].restarts >= 1
+    finally:
+        supervisor.stop()
+
+
+def test_row_limit():
+    assert row_limit('select * from t') is None
+    assert row_limit('select * from t', 10) == 10
+    assert row_limit('select * from t limit 5', 10) == 5
+    assert row_limit('select * from t limit 20, 5') == 5
+    assert row_limit('select * from t LIMIT 5 OFFSET 20') == 5
+    assert row_limit('/assert p(1)', 10) is None
+
+
+def test_push_select_limit():
+    assert push_select_limit('select * from t', None) == 'select * from t'
+    assert push_select_limit('SELECT DISTINCT a FROM t', 100) == 'SELECT TOP 100 DISTINCT a FROM t'
+    assert push_select_limit('select * from t limit 5', 100) == 'select * from t limit 5'
+    assert push_select_limit('select top 3 * from t', 100) == 'select top 3 * from t'
+    assert push_select_limit('/tapi select * from t', 100) == '/tapi select * from t'
+
+
+def test_fetch_limit_discards_tail(fake_des):
+    supervisor = DesSupervisor(fake_des, probe_interval=60)
+    supervisor.start()
+    try:
+        result = supervisor.open('select 1')
+        assert result.fetch(1) == [b'/tapi select 1']
+        assert not result.closed
+        result.close()
+        assert result.closed
+        assert supervisor.open('select 2').fetch() == [b'/tapi select 2']
+    finally:
+        supervisor.stop()
+
+
+def test_utf8_passthrough(fake_des):
+    supervisor = DesSupervisor(fake_des, probe_interval=60)
+    supervisor.start()
+    try:
+        lines = supervisor.open("select 'año' | 'canción'").fetch()
+        assert lines[0] == "/tapi select 'año' | 'canción'".encode('utf-8')
+    finally:
+        supervisor.stop()
+
+
+def test_replicated_write_and_rebuild(fake_des, tmp_path):
+    supervisor = DesSupervisor(fake_des, workers=2, probe_interval=0.2, replicated=True,
+                               snapshot_dir=str(tmp_path / 'snapshots'), snapshot_every=1)
+    supervisor.start()
+    try:
+        assert supervisor.execute('/assert p(1)').startswith(b'Info: Fact asserted (1).\r\n')
+        assert all(w.applied == 1 for w in supervisor.workers)
+
+        # Las lecturas se reparten entre las réplicas y todas ven la escritura
+        assert supervisor.execute('select facts').startswith(b'answer(p(1))\r\n')
+        assert supervisor.execute('select facts').startswith(b'answer(p(1))\r\n')
+
+        supervisor.workers[1].process.kill()
+        time.sleep(1)
+        wait_healthy(supervisor)
+        assert supervisor.workers[1].restarts >= 1
+        assert supervisor.workers[1].applied == 1
+        assert list((tmp_path / 'snapshots').iterdir())
+
+        supervisor.execute('/assert p(2)')
+        for worker in supervisor.workers:
+            assert supervisor._lease(worker)
+            assert worker.execute('/tapi select facts', timeout=5).startswith(b'answer(p(1),p(2))\r\n')
+            supervisor._release(worker)
+    finally:
+        supervisor.stop()
+
+
+def test_spool_releases_worker(fake_des):
+    supervisor = DesSupervisor(fake_des, query_timeout=1, probe_interval=60)
+    supervisor.start()
+    try:
+        result = supervisor.open('select slow')
+        result.spool()
+        # El único proceso queda libre aunque el resultado siga abierto
+        assert not supervisor.workers[0].busy
+        assert supervisor.execute('select 1').startswith(b'/tapi select 1\r\n')
+        assert result.fetch(1) == [b'row1']
+        assert not result.closed
+        assert result.fetch() == [b'row2']
+        assert result.closed
+    finally:
+        supervisor.stop()
+
+
+def test_spool_limit(fake_des):
+    supervisor = DesSupervisor(fake_des, probe_interval=60)
+    supervisor.start()
+    try:
+        result = supervisor.open('select slow')
+        result.spool(limit=1)
+        assert result.fetch() == [b'row1']
+        assert result.closed
+    finally:
+        supervisor.stop()
+
+
+def test_replicated_divergence(fake_des, tmp_path):
+    supervisor = DesSupervisor(fake_des, workers=2, probe_interval=60,
+                               replicated=True, snapshot_dir=str(tmp_path / 'snapshots'))
+    supervisor.start()
+    try:
+        first, second = supervisor.workers
+        # Un hecho que solo tiene la segunda réplica la hace divergir
+        assert supervisor._lease(second)
+        second.execute('/assert q(1)', timeout=5)
+        supervisor._release(second)
+
+        # Empate 1 a 1: vale la respuesta de la primera réplica
+        assert supervisor.execute('/assert p(1)').startswith(b'Info: Fact asserted (1).')
+        wait_healthy(supervisor)
+        assert second.restarts == 1
+        assert second.applied == supervisor.sequence
+        for _ in range(2):
+            assert supervisor.execute('select facts').startswith(b'answer(p(1))\r\n')
+    finally:
+        supervisor.stop()
+
+
+def test_replicated_divergence_while_busy(fake_des, tmp_path):
+    supervisor = DesSupervisor(fake_des, workers=3, probe_interval=60,
+                               replicated=True, snapshot_dir=str(tmp_path / 'snapshots'))
+    supervisor.start()
+    try:
+        third = supervisor.workers[2]
+        assert supervisor._lease(third)
+        third.execute('/assert q(1)', timeout=5)
+        supervisor._release(third)
+
+        # Un lector se lleva la réplica divergente justo después de que
+        # aplique la escritura: no debe atender más lecturas y se
+        # reconstruye cuando el lector la suelta.
+        release = supervisor._release
+        reader = []
+
+        def release_and_reacquire(worker):
+            release(worker)
+            if worker is third and not reader:
+                reader.append(worker)
+                worker.busy = True
+                threading.Timer(0.5, release, (worker,)).start()
+
+        supervisor._release = release_and_reacquire
+        supervisor.execute('/assert p(1)')
+        supervisor._release = release
+        assert third.applied == -1
+        assert third.restarts == 0
+        wait_healthy(supervisor)
+        assert third.restarts == 1
+        assert third.applied == supervisor.sequence
+    finally:
+        supervisor.stop()
+
+
+def test_replicated_periodic_snapshot(fake_des, tmp_path):
+    supervisor = DesSupervisor(fake_des, workers=2, probe_interval=60, replicated=True,
+                               snapshot_dir=str(tmp_path / 'snapshots'), snapshot_every=2)
+    supervisor.start()
+    try:
+        for n in range(5):
+            supervisor.execute('/assert p({})'.format(n))
+
+        # Una instantánea cada dos escrituras; solo se conservan la última
+        # y las escrituras posteriores a ella.
+        assert supervisor._snapshot[1] == 4
+        assert supervisor._log == [(5, '/assert p(4)')]
+        assert len(list((tmp_path / 'snapshots').iterdir())) == 1
+
+        supervisor.workers[0].process.kill()
+        supervisor.execute('select facts')
+        wait_healthy(supervisor)
+        for _ in range(2):
+            assert supervisor.execute('select facts').startswith(b'answer(p(0),p(1),p(2),p(3),p(4))')
+    finally:
+        supervisor.stop()
+
+
+def test_several_workers_replicate(fake_des, tmp_path):
+    supervisor = DesSupervisor(fake_des, workers=2, probe_interval=60,
+                               snapshot_dir=str(tmp_path / 'snapshots'))
+    supervisor.start()
+    try:
+        assert supervisor.replicated
+        supervisor.execute('/assert p(1)')
+        for _ in range(4):
+            assert supervisor.execute('select facts').startswith(b'answer(p(1))\r\n')
+    finally:
+        supervisor.stop()
@@ -0,0 +1,53 @@
+import os
+import threading
+import time
+
+from profiling import SamplingProfiler
+
+
+def busy(seconds):
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        pass
+
+
+def test_profile_queries(tmp_path):
+    profiler = SamplingProfiler(queries=1, interval=0.001, directory=str(tmp_path))
+
+    profiler.begin_query()
+    thread = threading.Thread(target=profiler.wrap(busy), args=(0.2,))
+    thread.start()
+    thread.join()
+    profiler.end_query()
+
+    assert profiler.finished
+    profiler.join(5)
+    assert os.path.exists(profiler.path)
+    names = [row[0] for row in profiler.summary(limit=None)]
+    assert 'test_profiling.py:busy' in names
+
+    with open(profiler.path) as file:
+        stack, count = file.readline().rsplit(' ', 1)
+    assert int(count) > 0
+
+
+def test_profile_window(tmp_path):
+    profiler = SamplingProfiler(seconds=0.2, directory=str(tmp_path))
+    time.sleep(0.5)
+    assert profiler.finished
+    assert profiler.samples > 0
+    profiler.join(5)
+    assert os.path.exists(profiler.path)
+
+
+def test_stop_does_not_write(tmp_path, monkeypatch):
+    profiler = SamplingProfiler(queries=5, directory=str(tmp_path))
+    caller = threading.get_ident()
+    writers = []
+    dump = profiler._dump
+    monkeypatch.setattr(profiler, '_dump', lambda: (writers.append(threading.get_ident()), dump()))
+
+    profiler.stop()
+    profiler.join(5)
+    assert writers and caller not in writers
+    assert os.path.exists(profiler.path)
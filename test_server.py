@@ -0,0 +1,133 @@
+import struct
+
+import pytest
+
+import server
+from des import DesResult
+from mysqlproto.protocol.flags import CharacterSet, Command
+from mysqlproto.protocol.handshake import HandshakeV10
+from mysqlproto.protocol import testing
+
+
+def run_commands(session, *commands):
+    handshake = HandshakeV10()
+
+    def handler(reader, writer):
+        return server.handle_commands(reader, writer, handshake, handshake.capability, session)
+    return testing.run_commands(handler, *commands)
+
+
+@pytest.fixture
+def session():
+    session = server.Session('test', CharacterSet.utf8mb4)
+    yield session
+    session.close()
+
+
+def test_ping(session):
+    assert run_commands(session, bytes([Command.COM_PING.value])) == [[b'\x00\x00\x00\x02\x00\x00\x00']]
+
+
+def test_init_db(session):
+    ret = run_commands(session, bytes([Command.COM_INIT_DB.value]) + 'año'.encode('utf-8'))
+    assert ret[0][0][0] == 0x00
+    assert session.schema == 'año'
+
+
+def test_field_list(session, monkeypatch):
+    monkeypatch.setitem(server.column_cache, 'people', ['name', 'age'])
+    cached, unknown = run_commands(session,
+                                   bytes([Command.COM_FIELD_LIST.value]) + b'People\x00',
+                                   bytes([Command.COM_FIELD_LIST.value]) + b'missing\x00')
+
+    assert len(cached) == 3
+    assert b'\x06People\x04name\x04name' in cached[0]
+    assert cached[0].endswith(b'\xfb')
+    assert b'\x03age' in cached[1]
+    assert cached[2][0] == 0xfe
+
+    assert len(unknown) == 1
+    assert unknown[0][0] == 0xfe
+
+
+def test_reset_connection(session):
+    session.charset = CharacterSet.latin1
+    session.set_select_limit('10')
+    ret = run_commands(session, bytes([Command.COM_RESET_CONNECTION.value]))
+    assert ret[0][0][0] == 0x00
+    assert session.schema == 'test'
+    assert session.select_limit is None
+    assert session.charset is CharacterSet.utf8mb4
+
+
+def test_statistics(session):
+    ret = run_commands(session, bytes([Command.COM_STATISTICS.value]))
+    assert len(ret) == 1 and len(ret[0]) == 1
+    assert ret[0][0].startswith(b'Uptime: ')
+    assert b'Questions: ' in ret[0][0]
+
+
+class FakeSupervisor:
+    def __init__(self, encoding, lines):
+        self.encoding = encoding
+        self.lines = lines
+
+    def open(self, query):
+        return DesResult(self, None, iter(()), self.lines)
+
+
+def test_results_follow_set_names(session, monkeypatch):
+    monkeypatch.setattr(server, 'supervisor', FakeSupervisor('utf-8', ['año | 1'.encode('utf-8')]),
+                        raising=False)
+    set_names, result = run_commands(session, b'\x03SET NAMES latin1', b'\x03select a, b from t')
+
+    assert set_names[0][0] == 0x00
+    # Columnas etiquetadas como latin1 y celdas recodificadas
+    assert struct.pack('<H', CharacterSet.latin1.value) in result[1]
+    assert result[4] == b'\x03a\xf1o\x011'
+
+
+def test_results_from_des_encoding(session, monkeypatch):
+    monkeypatch.setattr(server, 'supervisor', FakeSupervisor('cp1252', ['café €'.encode('cp1252')]),
+                        raising=False)
+    result, = run_commands(session, b'\x03select a from t')
+
+    assert struct.pack('<H', CharacterSet.utf8mb4.value) in result[1]
+    assert result[3] == b'\x09' + 'café €'.encode('utf-8')
+
+
+def test_cursor_binary_rows(session, monkeypatch):
+    monkeypatch.setattr(server, 'supervisor', FakeSupervisor('utf-8', [b'x | 1', b'y']), raising=False)
+    prepare, execute, fetch = run_commands(
+        session,
+        bytes([Command.COM_STMT_PREPARE.value]) + b'select a, b from t',
+        bytes([Command.COM_STMT_EXECUTE.value]) + struct.pack('<IBI', 1, 1, 1),
+        bytes([Command.COM_STMT_FETCH.value]) + struct.pack('<II', 1, 10))
+
+    assert prepare[0][:5] == b'\x00\x01\x00\x00\x00'
+    assert execute[0] == b'\x02' and len(execute) == 4
+    # Todas las filas tienen las dos columnas; la corta se completa con NULL
+    assert fetch[:2] == [b'\x00\x00\x01x\x011', b'\x00\x08\x01y']
+    assert fetch[2][0] == 0xfe and len(fetch) == 3
+
+
+def test_bad_packets_get_err(session, monkeypatch):
+    monkeypatch.setattr(server, 'supervisor', FakeSupervisor('utf-8', [b'x']), raising=False)
+    _, cursor, short, ping = run_commands(
+        session,
+        bytes([Command.COM_STMT_PREPARE.value]) + b'select a from t where b = ?',
+        bytes([Command.COM_STMT_EXECUTE.value]) + struct.pack('<IBI', 1, 3, 1) + b'\x00\x01\x03\x00' +
+        struct.pack('<i', 1),
+        bytes([Command.COM_STMT_EXECUTE.value]) + struct.pack('<IBI', 1, 0, 1) + b'\x00\x01\x03\x00',
+        bytes([Command.COM_PING.value]))
+
+    assert cursor[0][:3] == b'\xff\xd3\x04'
+    assert short[0][0] == 0xff
+    # La conexión sigue atendiendo comandos
+    assert ping == [b'\x00\x00\x00\x02\x00\x00\x00']
+
+
+def test_messages_follow_set_names(session):
+    _, profile = run_commands(session, b'\x03SET NAMES latin1', b'\x03SELECT @pyserver_profile')
+    assert profile[0][0] == 0xff
+    assert 'ningún'.encode('latin-1') in profile[0]